@@ -108,7 +108,7 @@ export function LogFilesSidebar() {
 
   const handleEditFileName = (filePath: string, event: React.MouseEvent) => {
     event.stopPropagation(); // Prevent toggling selection
-    const fileName = getFileName(filePath).replace(/\.jsonl$/, '');
+    const fileName = getFileName(filePath).replace(/\.jsonl(\.(gz|xz|zst))?$/, '');
     setEditingFile(filePath);
     setNewFileName(fileName);
   };
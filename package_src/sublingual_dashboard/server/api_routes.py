@@ -1,9 +1,23 @@
 from flask import Blueprint, jsonify, request
+import atexit
+import gzip
+import hmac
+import io
 import os
 import json
+import threading
 import config
 from evaluations.evaluation import Evaluation, chat_with_messages
-from typing import Dict, List, Optional
+from typing import Dict, Iterable, List, Optional, Tuple
+from sublingual_eval.logging.reader import RecordDecoder
+from sublingual_eval.logging.segments import (
+    INDEX_EXTENSION,
+    SEGMENT_EXTENSIONS,
+    iter_segment_lines,
+    segments_in_range,
+)
+from sublingual_eval.logging.sinks import JsonlSink
+from sublingual_eval.logging.sqlite_sink import DATABASE_FILE_NAME, query_records
 
 router = Blueprint('api', __name__)
 
@@ -150,23 +164,219 @@ def evaluate():
         return jsonify({"error": "Evaluation failed ", "details": str(e)}), 500
 
 
+def decode_records(lines: Iterable[bytes], log_dir: str) -> Tuple[List[Dict], int]:
+    """Parse logged JSON lines back into the records the capture layer produced.
+
+    See RecordDecoder for how stored contents are resolved. Records that
+    aren't LLM calls, such as capture_stats, are left out. Lines that can't
+    be parsed or decoded, such as the torn tail left by a process that was
+    killed mid-write or a malformed truncation marker, are skipped. Returns
+    the records and the number of lines skipped.
+    """
+    all_logs = []
+    skipped = 0
+    decoder = RecordDecoder(log_dir)
+    for line in lines:
+        try:
+            obj = decoder.decode(line)
+        except Exception:
+            skipped += 1
+            continue
+        if obj is None:
+            continue
+        # Coalesce session_id from extra_headers if it's not present
+        if obj.get("session_id") is None:
+            extra_info = obj.get("extra_info")
+            obj["session_id"] = (
+                extra_info.get("req_id") if isinstance(extra_info, dict) else None
+            )
+        all_logs.append(obj)
+    return all_logs, skipped
+
+
+def read_log_records(
+    filename: str, start: Optional[int] = None, end: Optional[int] = None
+) -> Tuple[List[Dict], int]:
+    """Load the records from a log segment, plain or compressed.
+
+    For compressed segments, blocks entirely outside [start, end] are skipped.
+    See decode_records for what is returned.
+    """
+    return decode_records(
+        iter_segment_lines(filename, start, end), os.path.dirname(filename)
+    )
+
+
+def records_response(records: List[Dict], skipped: int):
+    """JSON response for a list of records, reporting any unreadable lines in a header."""
+    response = jsonify(records)
+    response.headers["X-Subl-Skipped-Lines"] = str(skipped)
+    return response
+
+
+def segment_extension(path: str) -> str:
+    """Return the full segment extension of a log path, e.g. .jsonl.gz"""
+    for extension in sorted(SEGMENT_EXTENSIONS, key=len, reverse=True):
+        if path.endswith(extension):
+            return extension
+    return ".jsonl"
+
+
+def remove_log_file(path: str) -> None:
+    """Delete a log segment along with its block index, if it has one."""
+    os.remove(path)
+    if os.path.exists(path + INDEX_EXTENSION):
+        os.remove(path + INDEX_EXTENSION)
+
+
 @router.route("/get_log")
 def get_log():
     filename = request.args.get("filename", "")
     try:
-        all_logs = []
-        with open(filename, "r") as f:
-            for line in f:
-                obj = json.loads(line)
-                # Coalesce session_id from extra_headers if it's not present
-                if obj["session_id"] is None:
-                    obj["session_id"] = obj.get("extra_info", {}).get("req_id", None)
-                all_logs.append(obj)
-        return jsonify(all_logs)
+        return records_response(*read_log_records(filename))
     except FileNotFoundError:
         return jsonify({"error": f"Log file {filename} not found"}), 404
-    except json.JSONDecodeError:
-        return jsonify({"error": "Invalid JSON in log file"}), 500
+
+
+@router.route("/get_logs_in_range")
+def get_logs_in_range():
+    """Return records from every segment with timestamps between start and end.
+
+    Segments whose manifest time range falls outside the window are never opened.
+    """
+    start = request.args.get("start", type=int)
+    end = request.args.get("end", type=int)
+    log_dir = os.path.join(config.project_dir, "logs")
+    all_logs = []
+    skipped = 0
+    for path in segments_in_range(log_dir, start, end):
+        try:
+            records, segment_skipped = read_log_records(path, start, end)
+        except FileNotFoundError:
+            # Removed since it was listed
+            continue
+        skipped += segment_skipped
+        for obj in records:
+            ts = obj.get("timestamp")
+            if start is not None and ts is not None and ts < start:
+                continue
+            if end is not None and ts is not None and ts > end:
+                continue
+            all_logs.append(obj)
+    all_logs.sort(key=lambda obj: obj.get("timestamp") or 0)
+    return records_response(all_logs, skipped)
+
+
+# Records POSTed to /ingest are appended to this server's own log segments
+MAX_INGEST_BYTES = 64 * 1024 * 1024
+LOOPBACK_ADDRESSES = ("127.0.0.1", "::1")
+ingest_sink = JsonlSink()
+ingest_lock = threading.Lock()
+
+
+def close_ingest_sink():
+    with ingest_lock:
+        ingest_sink.close()
+
+
+atexit.register(close_ingest_sink)
+
+
+def is_call_record(obj) -> bool:
+    """Whether obj looks like a record of one LLM call, as the capture layer writes them."""
+    return (
+        isinstance(obj, dict)
+        and "record_type" not in obj
+        and isinstance(obj.get("log_id"), str)
+        and isinstance(obj.get("timestamp"), (int, float))
+        and not isinstance(obj.get("timestamp"), bool)
+        and "session_id" in obj
+    )
+
+
+@router.route("/ingest", methods=["POST"])
+def ingest():
+    """Append records sent by another host's http log sink to this project's logs.
+
+    The body is JSON lines, gzip-compressed when Content-Encoding is gzip.
+    If SUBL_INGEST_TOKEN is set, requests must carry it as a bearer token;
+    without it only requests from this host are accepted. Lines that aren't
+    LLM call records are skipped.
+    """
+    token = os.getenv("SUBL_INGEST_TOKEN")
+    if token:
+        if not hmac.compare_digest(
+            request.headers.get("Authorization", ""), f"Bearer {token}"
+        ):
+            return jsonify({"error": "Unauthorized"}), 401
+    elif request.remote_addr not in LOOPBACK_ADDRESSES:
+        return jsonify({"error": "Set SUBL_INGEST_TOKEN to accept logs from other hosts"}), 403
+
+    if request.content_length is not None and request.content_length > MAX_INGEST_BYTES:
+        return jsonify({"error": "Body too large"}), 413
+    body = request.stream.read(MAX_INGEST_BYTES + 1)
+    if len(body) > MAX_INGEST_BYTES:
+        return jsonify({"error": "Body too large"}), 413
+    if request.headers.get("Content-Encoding") == "gzip":
+        try:
+            with gzip.GzipFile(fileobj=io.BytesIO(body)) as f:
+                body = f.read(MAX_INGEST_BYTES + 1)
+        except (OSError, EOFError):
+            return jsonify({"error": "Invalid gzip body"}), 400
+    if len(body) > MAX_INGEST_BYTES:
+        return jsonify({"error": "Body too large"}), 413
+
+    records = []
+    lines = []
+    skipped = 0
+    for line in body.splitlines():
+        if not line.strip():
+            continue
+        try:
+            obj = json.loads(line)
+        except ValueError:
+            obj = None
+        if not is_call_record(obj):
+            skipped += 1
+            continue
+        records.append(obj)
+        lines.append(line + b"\n")
+
+    if records:
+        log_dir = os.path.join(config.project_dir, "logs")
+        os.makedirs(log_dir, exist_ok=True)
+        with ingest_lock:
+            ingest_sink.write(log_dir, records, lines)
+    return jsonify({"received": len(records), "skipped": skipped})
+
+
+@router.route("/query_logs")
+def query_logs():
+    """Return the records matching the given filters from the SQLite log database.
+
+    Filters on start, end, model, session_id, call_site and min_duration_ms
+    are answered from the database indexes. Only records captured with
+    SUBL_LOG_SINK including sqlite are found. The newest `limit` matches are
+    returned, oldest first.
+    """
+    db_path = os.path.join(config.project_dir, DATABASE_FILE_NAME)
+    if not os.path.exists(db_path):
+        return jsonify({"error": "No log database, capture with SUBL_LOG_SINK=sqlite"}), 404
+    lines = query_records(
+        db_path,
+        start=request.args.get("start", type=int),
+        end=request.args.get("end", type=int),
+        model=request.args.get("model"),
+        session_id=request.args.get("session_id"),
+        call_site=request.args.get("call_site"),
+        min_duration_ms=request.args.get("min_duration_ms", type=float),
+        limit=request.args.get("limit", default=1000, type=int),
+    )
+    records, skipped = decode_records(
+        lines, os.path.join(config.project_dir, "logs")
+    )
+    records.reverse()
+    return records_response(records, skipped)
 
 
 @router.route("/get_available_logs")
@@ -174,7 +384,11 @@ def get_available_logs():
     log_dir = os.path.join(config.project_dir, "logs")
     if not os.path.exists(log_dir):
         return jsonify([])
-    files = [os.path.join(log_dir, f) for f in os.listdir(log_dir)]
+    files = [
+        os.path.join(log_dir, f)
+        for f in os.listdir(log_dir)
+        if f.endswith(SEGMENT_EXTENSIONS)
+    ]
     # Get creation time for each file and sort descending
     files_with_time = [(f, os.path.getctime(f)) for f in files]
     files_with_time.sort(key=lambda x: x[1], reverse=True)
@@ -195,14 +409,16 @@ def rename_log():
         # Get the directory and old filename
         directory = os.path.dirname(old_path)
         # Create new path with the new name
-        new_path = os.path.join(directory, f"{new_name}.jsonl")
+        new_path = os.path.join(directory, f"{new_name}{segment_extension(old_path)}")
 
         # Check if new filename already exists
         if os.path.exists(new_path):
             return jsonify({"error": "A file with this name already exists"}), 400
 
-        # Rename the file
+        # Rename the file, keeping a compressed segment's block index with it
         os.rename(old_path, new_path)
+        if os.path.exists(old_path + INDEX_EXTENSION):
+            os.rename(old_path + INDEX_EXTENSION, new_path + INDEX_EXTENSION)
         return jsonify({"success": True, "new_path": new_path})
     except Exception as e:
         return jsonify({"error": str(e)}), 500
@@ -220,7 +436,7 @@ def delete_log():
         if not os.path.exists(file_path):
             return jsonify({"error": "File not found"}), 404
 
-        os.remove(file_path)
+        remove_log_file(file_path)
         return jsonify({"success": True})
     except Exception as e:
         return jsonify({"error": str(e)}), 500
@@ -308,7 +524,7 @@ def delete_logs():
                 results["failed"].append({"path": file_path, "reason": "File not found"})
                 continue
 
-            os.remove(file_path)
+            remove_log_file(file_path)
             results["success"].append(file_path)
         except Exception as e:
             results["failed"].append({"path": file_path, "reason": str(e)})
@@ -11,7 +11,7 @@ import logging
 from api_routes import router, initialize_metrics
 
 app = Flask(__name__)
-CORS(app)
+CORS(app, expose_headers=["X-Subl-Skipped-Lines"])
 
 app.register_blueprint(router, url_prefix="/api")
 
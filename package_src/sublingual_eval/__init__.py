@@ -0,0 +1,23 @@
+def stats():
+    """What capture has cost this process so far.
+
+    Returns a dict with the time spent in each capture phase ("phases": the
+    count, mean, p50, p90, p99 and max in microseconds), the log writer's
+    counters ("writer", None if nothing was logged yet), the stack frame
+    cache's counters ("frame_cache"), the calls sampled in and out
+    ("sampler") and the governor's current capture level ("governor"); the
+    last two are None unless sampling or a capture budget is configured.
+    """
+    # Imported here so importing sublingual_eval stays free
+    from sublingual_eval.logging import governor, log_writer, sampling
+    from sublingual_eval.logging.overhead import phase_stats
+    from sublingual_eval.logging.stack_capture import frame_cache_stats
+
+    writer = log_writer._log_writer
+    return {
+        "phases": phase_stats(),
+        "writer": writer.stats() if writer is not None else None,
+        "frame_cache": frame_cache_stats(),
+        "sampler": sampling._sampler.stats() if sampling._sampler is not None else None,
+        "governor": governor._governor.stats() if governor._governor is not None else None,
+    }
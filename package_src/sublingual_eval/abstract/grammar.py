@@ -1,5 +1,7 @@
 import ast
+import copy
 import inspect
+import os
 import textwrap
 
 # --- Helper classes for our grammar representation ---
@@ -406,13 +408,42 @@ def get_complete_statement(lines, start_line, forward=True):
     
     return None
 
+# --- Per call site cache of get_arg_node ---
+# The result only depends on the caller's source, so it is computed once per
+# (code object, line) and again only when the source file changes.
+
+ARG_NODE_CACHE_SIZE = 1024
+_arg_node_cache = {}
+_call_names_cache = {}
+
+def _source_mtime(filename):
+    try:
+        return os.stat(filename).st_mtime_ns
+    except OSError:
+        return None
+
 def get_arg_node(frame, func_name):
+    return get_call_arg_node(frame.f_code, frame.f_lineno, func_name)
+
+def get_call_arg_node(code, lineno, func_name):
+    key = (code, lineno, func_name)
+    mtime = _source_mtime(code.co_filename)
+    cached = _arg_node_cache.get(key)
+    if cached is not None and cached[0] == mtime:
+        return cached[1]
+    result = parse_arg_node(code, lineno, func_name)
+    if len(_arg_node_cache) >= ARG_NODE_CACHE_SIZE:
+        _arg_node_cache.clear()
+    _arg_node_cache[key] = (mtime, result)
+    return result
+
+def parse_arg_node(code, lineno, func_name):
     try:
-        source = textwrap.dedent(inspect.getsource(frame.f_code))
+        source = textwrap.dedent(inspect.getsource(code))
         full_tree = ast.parse(source)
         full_env = build_env_with_flags(full_tree, 1, len(source.split('\n')))
-        start_line = frame.f_code.co_firstlineno
-        call_lineno = frame.f_lineno - start_line + 1
+        start_line = code.co_firstlineno
+        call_lineno = lineno - start_line + 1
         lines = source.split('\n')
         statement = get_complete_statement(lines, call_lineno - 1)
         
@@ -455,6 +486,73 @@ def grammar(var_value):
         return "<unsupported input type>"
     return process_messages(arg_node, env, f_locals=caller_frame.f_locals)
 
+def _referenced_names(arg_node, env):
+    names = set()
+    pending = [arg_node] if arg_node is not None else []
+    while pending:
+        for node in ast.walk(pending.pop()):
+            if isinstance(node, ast.Name):
+                name = node.id
+            elif isinstance(node, ast.arg):
+                name = node.arg
+            else:
+                continue
+            if name not in names:
+                names.add(name)
+                # Follow assignments, the way resolve_expr does
+                if name in env:
+                    pending.append(env[name][0])
+    return frozenset(names)
+
+def get_call_names(code, lineno, func_name):
+    """Names of the variables a call's messages may be built from, cached like get_call_arg_node"""
+    parsed = get_call_arg_node(code, lineno, func_name)
+    key = (code, lineno, func_name)
+    cached = _call_names_cache.get(key)
+    if cached is not None and cached[0] is parsed:
+        return cached[1]
+    names = _referenced_names(*parsed)
+    if len(_call_names_cache) >= ARG_NODE_CACHE_SIZE:
+        _call_names_cache.clear()
+    _call_names_cache[key] = (parsed, names)
+    return names
+
+def _snapshot_local(value):
+    # Lists, dicts and the like are what prompts are usually built from, and
+    # what callers change after the call; other objects are kept as they are
+    if isinstance(value, (list, dict, set, tuple)):
+        try:
+            return copy.deepcopy(value)
+        except Exception:
+            pass
+    return value
+
+class DeferredGrammar:
+    """A call's grammar, captured now and worked out later on another thread.
+
+    Only the call site and a snapshot of the caller's locals are taken. The
+    container values the call's messages are built from are deep-copied, so
+    changes the caller makes to them after the call don't show up in the
+    grammar; other locals, and mutable objects of other types, are read
+    when the grammar is resolved.
+    """
+    def __init__(self, frame, func_name, f_locals=None):
+        self.code = frame.f_code
+        self.lineno = frame.f_lineno
+        self.func_name = func_name
+        if f_locals is None:
+            self.f_locals = None
+        else:
+            names = get_call_names(self.code, self.lineno, func_name)
+            self.f_locals = {
+                name: _snapshot_local(value) if name in names else value
+                for name, value in f_locals.items()
+            }
+    def resolve(self):
+        arg_node, env = get_call_arg_node(self.code, self.lineno, self.func_name)
+        grammar_result = process_messages(arg_node, env, f_locals=self.f_locals)
+        return convert_grammar_to_dict(grammar_result)
+
 def convert_grammar_to_dict(grammar_result):
     """Convert grammar objects to JSON-serializable dictionaries"""
     if isinstance(grammar_result, list):
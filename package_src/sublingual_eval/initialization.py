@@ -15,6 +15,8 @@ from sublingual_eval.logging.anthropic_logger import (
     setup_anthropic_logging,
     setup_anthropic_async_logging,
 )
+from sublingual_eval.logging.governor import governor_from_env
+from sublingual_eval.logging.sampling import sampler_from_env
 import os
 import sysconfig
 from posthog import Posthog
@@ -86,10 +88,12 @@ def init():
             print(f"\033[93m[sublingual] Warning:\033[0m Failed to capture telemetry: {e}")
 
 
-    # Setup logging
+    # Setup logging, sampling the calls and bounding capture overhead if configured
+    sampler = sampler_from_env()
+    governor = governor_from_env()
     if os.getenv("SUBL_PATCH_OPENAI", "0") == "1":
-        setup_openai_logging(subl_logs_path)
-        setup_openai_async_logging(subl_logs_path)
+        setup_openai_logging(subl_logs_path, sampler, governor)
+        setup_openai_async_logging(subl_logs_path, sampler, governor)
     if os.getenv("SUBL_PATCH_FASTAPI", "0") == "1":
         setup_fastapi_logging()
     if os.getenv("SUBL_PATCH_DJANGO", "0") == "1":
@@ -99,5 +103,5 @@ def init():
         os.environ["FLASK_RUN_FROM_RELOADER"] = "false"
         setup_flask_logging()
     if os.getenv("SUBL_PATCH_ANTHROPIC", "0") == "1":
-        setup_anthropic_logging(subl_logs_path)
-        setup_anthropic_async_logging(subl_logs_path)
+        setup_anthropic_logging(subl_logs_path, sampler, governor)
+        setup_anthropic_async_logging(subl_logs_path, sampler, governor)
@@ -0,0 +1,242 @@
+import heapq
+import json
+import os
+import re
+import sys
+from sublingual_eval.logging.compression import codec_for_path
+from sublingual_eval.logging.segments import (
+    INDEX_EXTENSION,
+    SEGMENT_EXTENSIONS,
+    iter_segment_lines,
+    read_manifest,
+)
+
+# How much of a file is read at a time when scanning back from its end
+TAIL_CHUNK_SIZE = 64 * 1024
+
+
+def list_segments(logs_dir):
+    """Return the paths of all log segments in a logs directory"""
+    if not os.path.isdir(logs_dir):
+        return []
+    return sorted(
+        os.path.join(logs_dir, f)
+        for f in os.listdir(logs_dir)
+        if f.endswith(SEGMENT_EXTENSIONS)
+    )
+
+
+def iter_timestamped_lines(path):
+    """Yield (timestamp, line) for each record in a segment, skipping unreadable lines"""
+    for line in iter_segment_lines(path):
+        if not line.endswith(b"\n"):
+            line += b"\n"
+        try:
+            record = json.loads(line)
+        except ValueError:
+            print(
+                f"\033[93m[sublingual] Warning:\033[0m Skipping unreadable line in {path}",
+                file=sys.stderr,
+            )
+            continue
+        yield record.get("timestamp") or 0, line
+
+
+def merge_segments(paths, out):
+    """K-way merge segments into one stream ordered by timestamp.
+
+    Each segment is written by a single process and is already in timestamp
+    order, so only one line per segment is held in memory at a time. Lines
+    are copied through as-is. Returns the number of records written.
+    """
+    streams = [iter_timestamped_lines(path) for path in paths]
+    count = 0
+    for _, line in heapq.merge(*streams, key=lambda item: item[0]):
+        out.write(line)
+        count += 1
+    return count
+
+
+def merge_command(args):
+    paths = args.segments or list_segments(os.path.join(args.project_dir, "logs"))
+    if args.output:
+        output = os.path.abspath(args.output)
+        paths = [p for p in paths if os.path.abspath(p) != output]
+    if not paths:
+        print("\033[94m[sublingual]\033[0m No log segments to merge")
+        return 1
+
+    if args.output:
+        with open(args.output, "wb") as out:
+            count = merge_segments(paths, out)
+        print(
+            f"\033[94m[sublingual]\033[0m Merged {count} records from {len(paths)} segments into {args.output}"
+        )
+    else:
+        merge_segments(paths, sys.stdout.buffer)
+        sys.stdout.flush()
+    return 0
+
+
+def find_tail_end(f, size):
+    """Return the offset just past the last newline in f, reading back from size"""
+    pos = size
+    while pos > 0:
+        start = max(0, pos - TAIL_CHUNK_SIZE)
+        f.seek(start)
+        chunk = f.read(pos - start)
+        i = chunk.rfind(b"\n")
+        if i != -1:
+            return start + i + 1
+        pos = start
+    return 0
+
+
+def _truncate_tail(path):
+    """Cut a file back to its last newline, returning the number of bytes removed"""
+    with open(path, "r+b") as f:
+        size = f.seek(0, os.SEEK_END)
+        end = find_tail_end(f, size)
+        if end < size:
+            f.truncate(end)
+    return size - end
+
+
+def _repair_compressed(path, codec):
+    """Cut a compressed segment back to its last complete block.
+
+    Blocks written after the last index entry are kept, and indexed, if they
+    decompress to whole lines.
+    """
+    index_path = path + INDEX_EXTENSION
+    if not os.path.exists(index_path):
+        raise ValueError("no block index")
+    _truncate_tail(index_path)
+    size = os.path.getsize(path)
+
+    with open(index_path, "r+b") as f:
+        # Drop index entries for blocks that never fully reached the segment
+        valid_end = 0
+        indexed_end = 0
+        offset = 0
+        for line in f:
+            offset += len(line)
+            try:
+                block = json.loads(line)
+            except ValueError:
+                break
+            if block["offset"] + block["length"] > size:
+                break
+            valid_end = offset
+            indexed_end = block["offset"] + block["length"]
+        f.truncate(valid_end)
+
+    with open(path, "r+b") as f:
+        f.seek(indexed_end)
+        trailing = f.read()
+        if not trailing:
+            return 0
+        try:
+            data = codec.decompress(trailing)
+        except Exception:
+            data = None
+        if data is not None and data.endswith(b"\n"):
+            entry = {
+                "offset": indexed_end,
+                "length": len(trailing),
+                "records": data.count(b"\n"),
+                "raw_bytes": len(data),
+                # Unknown, so readers always read this block
+                "start_ts": None,
+                "end_ts": None,
+            }
+            with open(index_path, "ab") as index_file:
+                index_file.write(json.dumps(entry).encode("utf-8") + b"\n")
+            return 0
+        f.truncate(indexed_end)
+    return len(trailing)
+
+
+def repair_segment(path):
+    """Remove a torn tail from a segment, returning the number of bytes removed.
+
+    Records are newline-terminated JSON objects, so everything after the last
+    newline is a partial record. Only the end of the file is read.
+    """
+    codec = codec_for_path(path)
+    if codec is None:
+        return _truncate_tail(path)
+    return _repair_compressed(path, codec)
+
+
+def _writer_is_alive(path):
+    """Whether the process that named this segment (…_<pid>.jsonl) is still running"""
+    match = re.search(r"_(\d+)(?:_\d+)?\.jsonl", os.path.basename(path))
+    if match is None:
+        return False
+    try:
+        os.kill(int(match.group(1)), 0)
+    except ProcessLookupError:
+        return False
+    except (PermissionError, OSError):
+        return True
+    return True
+
+
+def repair_command(args):
+    logs_dir = os.path.join(args.project_dir, "logs")
+    paths = args.segments or list_segments(logs_dir)
+    if not paths:
+        print("\033[94m[sublingual]\033[0m No log segments to repair")
+        return 1
+
+    closed = read_manifest(logs_dir)
+    failed = False
+    for path in paths:
+        name = os.path.basename(path)
+        if not args.force and name not in closed and _writer_is_alive(path):
+            # Its process may be in the middle of a write
+            print(
+                f"\033[93m[sublingual] Warning:\033[0m Skipping {name}, still being written (use --force to repair anyway)"
+            )
+            continue
+        try:
+            removed = repair_segment(path)
+        except (OSError, ValueError) as e:
+            print(f"\033[91m[sublingual] Error:\033[0m Could not repair {name}: {e}")
+            failed = True
+            continue
+        if removed:
+            print(
+                f"\033[94m[sublingual]\033[0m Removed a torn tail of {removed} bytes from {name}"
+            )
+    return 1 if failed else 0
+
+
+def convert_command(args):
+    # Imported here so only conversion pays for importing pyarrow
+    from sublingual_eval.logging.columnar import convert_segments, format_for_path
+
+    fmt = args.format or format_for_path(args.output)
+    if fmt is None:
+        print(
+            "\033[91m[sublingual] Error:\033[0m Can't tell the format from the output name, use a .parquet or .arrow file or pass --format"
+        )
+        return 1
+    paths = args.segments or list_segments(os.path.join(args.project_dir, "logs"))
+    if not paths:
+        print("\033[94m[sublingual]\033[0m No log segments to convert")
+        return 1
+    try:
+        count, skipped = convert_segments(paths, args.output, fmt)
+    except ValueError as e:
+        print(f"\033[91m[sublingual] Error:\033[0m {e}")
+        return 1
+    print(
+        f"\033[94m[sublingual]\033[0m Converted {count} records from {len(paths)} segments into {args.output}"
+    )
+    if skipped:
+        print(
+            f"\033[93m[sublingual] Warning:\033[0m Skipped {skipped} unreadable lines"
+        )
+    return 0
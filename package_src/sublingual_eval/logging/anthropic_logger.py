@@ -3,73 +3,90 @@ import logging
 import time
 import inspect
 import json
-import os
-from datetime import datetime
-import contextvars
 import uuid
 from anthropic import Anthropic, AsyncAnthropic
 from anthropic.resources.messages import Messages, AsyncMessages
+from sublingual_eval.logging.governor import CAPTURE_LEVELS, NO_STACK
+from sublingual_eval.logging.log_writer import get_log_writer
+from sublingual_eval.logging.openai_logger import request_id_ctx_var
+from sublingual_eval.logging.overhead import record_phase
+from sublingual_eval.logging.redaction import redact_messages
+from sublingual_eval.logging.serialization import snapshot
+from sublingual_eval.logging.stack_capture import capture_stack, resolve_stack
 
 # Set up logging
 logger = logging.getLogger("sublingual")
 
-# Context variable for request tracking
-request_id_ctx_var = contextvars.ContextVar("request_id", default=None)
 
-# Set up output file name
-output_file_name = f"{datetime.now().strftime('%Y-%m-%d_%H-%M-%S')}.jsonl"
+def write_logged_data(subl_logs_path, logged_data):
+    """Hand the record to the background log writer"""
+    start = time.perf_counter_ns()
+    get_log_writer().submit(subl_logs_path, logged_data, finalize=finalize_logged_data)
+    record_phase("enqueue", time.perf_counter_ns() - start)
 
 
-def write_logged_data(subl_logs_path, logged_data, file_name):
-    with open(os.path.join(subl_logs_path, file_name), "a") as f:
-        f.write(json.dumps(logged_data) + "\n")
+async def awrite_logged_data(subl_logs_path, logged_data):
+    """Like write_logged_data, but never blocks the event loop"""
+    start = time.perf_counter_ns()
+    await get_log_writer().asubmit(subl_logs_path, logged_data, finalize=finalize_logged_data)
+    record_phase("enqueue", time.perf_counter_ns() - start)
 
 
-def create_logged_data(result, args, kwargs, caller_frame):
-    """Create the logged data dictionary from a completion result"""
-    # Get the full stack trace
-    stack = inspect.stack()
-    stack_info = []
-
-    project_root = os.getcwd()
-    excluded_patterns = [
-        "<frozen",
-        "site-packages",
-        "dist-packages",
-        "lib/python",
-    ]
-
-    for frame_info in reversed(stack):
-        filename = frame_info.filename
-        abs_filename = os.path.abspath(filename)
-
-        if any(pattern in filename for pattern in excluded_patterns):
-            continue
-
-        if not abs_filename.startswith(project_root):
-            continue
+def create_logged_data(result, args, kwargs, caller_frame, capture_level=None):
+    """Create the logged data dictionary from a completion result, at the governor's capture_level"""
+    # Source lines are read on the writer thread, see finalize_logged_data
+    start = time.perf_counter_ns()
+    if capture_level is None or capture_level < NO_STACK:
+        stack = capture_stack(caller_frame)
+    else:
+        stack = []
+    stack_done = time.perf_counter_ns()
+    record_phase("stack", stack_done - start)
 
-        code_context = frame_info.code_context if frame_info.code_context else []
-        stack_info.append(
-            {
-                "filename": frame_info.filename,
-                "lineno": frame_info.lineno,
-                "code_context": code_context,
-                "function": frame_info.function,
-            }
-        )
-    # Process messages - just get them directly from kwargs
-    messages = kwargs.get("messages", [])
+    # Process messages - copy them since the record is serialized later on
+    # the writer thread and callers commonly change them after the call;
+    # base64 images and documents are redacted there, see finalize_logged_data
+    messages = [snapshot(msg) for msg in kwargs.get("messages", [])]
 
     # Add system message if present
     if kwargs.get("system"):
-        messages = [{"role": "system", "content": kwargs["system"]}] + messages
+        messages = [{"role": "system", "content": snapshot(kwargs["system"])}] + messages
 
+    logged_data = {
+        "log_id": str(uuid.uuid4()),
+        "session_id": request_id_ctx_var.get(),
+        "messages": messages,  # Use messages directly
+        "grammar_result": None,  # Not applicable for Anthropic
+        "symbolic_mappings": [],  # Not applicable for Anthropic
+        # Formatted on the writer thread, see finalize_logged_data
+        "response": result,
+        "usage": None,
+        "timestamp": int(time.time()),
+        "stack_trace": stack,
+        "call_parameters": {
+            "model": kwargs.get("model"),
+            "temperature": kwargs.get("temperature"),
+            "max_tokens": kwargs.get("max_tokens"),
+            "top_p": kwargs.get("top_p"),
+            "stop_sequences": kwargs.get("stop_sequences"),
+        },
+        "extra_info": {
+            **kwargs.get("extra_headers", {}),
+        },
+    }
+    if capture_level is not None:
+        logged_data["capture_level"] = CAPTURE_LEVELS[capture_level]
+    record_phase("record", time.perf_counter_ns() - stack_done)
+    return logged_data
+
+
+def format_response(result, created):
+    """Convert an Anthropic Message to the OpenAI-style response dict we log"""
     # Format response similar to OpenAI's structure
     response_dict = {
         "id": result.id,
         "model": result.model,
-        "created": int(time.time()),
+        "created": created,
         "object": "anthropic.messages",
         "usage": {
             "prompt_tokens": result.usage.input_tokens,
@@ -109,26 +126,18 @@ def create_logged_data(result, args, kwargs, caller_frame):
         {"finish_reason": result.stop_reason, "index": 0, "message": choice_message}
     ]
 
+    return response_dict
+
+
+def finalize_logged_data(logged_data):
+    """Runs on the writer thread before the record is serialized"""
+    response_dict = format_response(logged_data["response"], logged_data["timestamp"])
     return {
-        "log_id": str(uuid.uuid4()),
-        "session_id": request_id_ctx_var.get(),
-        "messages": messages,  # Use messages directly
-        "grammar_result": None,  # Not applicable for Anthropic
-        "symbolic_mappings": [],  # Not applicable for Anthropic
+        **logged_data,
+        "messages": redact_messages(logged_data["messages"]),
+        "stack_trace": resolve_stack(logged_data["stack_trace"]),
         "response": response_dict,
         "usage": response_dict["usage"],
-        "timestamp": int(time.time()),
-        "stack_trace": stack_info,
-        "call_parameters": {
-            "model": kwargs.get("model"),
-            "temperature": kwargs.get("temperature"),
-            "max_tokens": kwargs.get("max_tokens"),
-            "top_p": kwargs.get("top_p"),
-            "stop_sequences": kwargs.get("stop_sequences"),
-        },
-        "extra_info": {
-            **kwargs.get("extra_headers", {}),
-        },
     }
 
 
@@ -149,42 +158,73 @@ def _convert_to_dict(obj):
         return obj
 
 
-def setup_anthropic_logging(subl_logs_path: str):
-    """Set up synchronous logging for Anthropic completions"""
+def setup_anthropic_logging(subl_logs_path: str, sampler=None, governor=None):
+    """Set up synchronous logging for Anthropic completions, for the calls sampler and governor keep"""
     # Store the original create method
     original_messages_create = Messages.create
 
     @functools.wraps(original_messages_create)
     def logged_messages_create(self, *args, **kwargs):
+        start_time = time.perf_counter()
         result = original_messages_create(self, *args, **kwargs)
+        caller_frame = inspect.currentframe().f_back
+        if sampler is not None and not sampler.keep(
+            caller_frame,
+            request_id_ctx_var.get(),
+            round((time.perf_counter() - start_time) * 1000),
+        ):
+            return result
+        capture_level = None
+        if governor is not None:
+            capture_level = governor.admit()
+            if capture_level is None:
+                return result
+            capture_start = time.thread_time_ns()
         try:
-            caller_frame = inspect.currentframe().f_back
-            logged_data = create_logged_data(result, args, kwargs, caller_frame)
-            write_logged_data(subl_logs_path, logged_data, output_file_name)
+            logged_data = create_logged_data(result, args, kwargs, caller_frame, capture_level)
+            write_logged_data(subl_logs_path, logged_data)
         except Exception as e:
             logger.error(
                 "\033[92m\033[94m[sublingual]\033[0m Error in logged_messages_create: %s",
                 e,
             )
         finally:
+            if governor is not None:
+                governor.record(time.thread_time_ns() - capture_start)
             return result
 
     # Replace the create method
     Messages.create = logged_messages_create
 
 
-def setup_anthropic_async_logging(subl_logs_path: str):
-    """Set up asynchronous logging for Anthropic completions"""
+def setup_anthropic_async_logging(subl_logs_path: str, sampler=None, governor=None):
+    """Set up asynchronous logging for Anthropic completions, for the calls sampler and governor keep"""
     # Store the original acreate method
     original_messages_acreate = AsyncMessages.create
 
     @functools.wraps(original_messages_acreate)
     async def logged_messages_acreate(self, *args, **kwargs):
+        start_time = time.perf_counter()
         result = await original_messages_acreate(self, *args, **kwargs)
+        caller_frame = inspect.currentframe().f_back
+        if sampler is not None and not sampler.keep(
+            caller_frame,
+            request_id_ctx_var.get(),
+            round((time.perf_counter() - start_time) * 1000),
+        ):
+            return result
+        capture_level = None
+        if governor is not None:
+            capture_level = governor.admit()
+            if capture_level is None:
+                return result
+            capture_start = time.thread_time_ns()
         try:
-            caller_frame = inspect.currentframe().f_back
-            logged_data = create_logged_data(result, args, kwargs, caller_frame)
-            write_logged_data(subl_logs_path, logged_data, output_file_name)
+            logged_data = create_logged_data(result, args, kwargs, caller_frame, capture_level)
+            if governor is not None:
+                # Before awaiting, while the thread's CPU time is all ours
+                governor.record(time.thread_time_ns() - capture_start)
+            await awrite_logged_data(subl_logs_path, logged_data)
         except Exception as e:
             logger.error(
                 "\033[92m\033[94m[sublingual]\033[0m Error in logged_messages_acreate: %s",
@@ -0,0 +1,109 @@
+import hashlib
+import os
+import re
+
+BLOBS_DIR_NAME = "blobs"
+BLOB_REF_KEY = "$blob"
+
+# What a blob reference holds: a sha256 hex digest, and nothing that could
+# lead the path out of the store
+DIGEST_PATTERN = re.compile(r"[0-9a-f]{64}")
+
+
+def blobs_dir(logs_dir):
+    """The blob store lives next to the logs directory, e.g. .sublingual/blobs"""
+    return os.path.join(os.path.dirname(os.path.abspath(logs_dir)), BLOBS_DIR_NAME)
+
+
+class BlobStore:
+    """Content-addressed store that keeps each distinct piece of content once.
+
+    Blobs are stored as <root>/<first two hex digits>/<sha256>, so records
+    only need to carry the digest.
+    """
+
+    def __init__(self, root):
+        self.root = root
+        self._known = set()
+
+    def _path(self, digest):
+        return os.path.join(self.root, digest[:2], digest)
+
+    def put(self, data):
+        """Store data if it isn't stored yet and return its digest"""
+        digest = hashlib.sha256(data).hexdigest()
+        if digest in self._known:
+            return digest
+        path = self._path(digest)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # Write under a unique name first so concurrent writers and
+            # readers never see a partial blob
+            tmp_path = f"{path}.{os.getpid()}.tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        self._known.add(digest)
+        return digest
+
+    def get(self, digest):
+        if not isinstance(digest, str) or not DIGEST_PATTERN.fullmatch(digest):
+            raise ValueError(f"not a blob digest: {digest!r}")
+        with open(self._path(digest), "rb") as f:
+            return f.read()
+
+
+def _externalize_text(text, store, min_bytes):
+    data = text.encode("utf-8")
+    if len(data) < min_bytes:
+        return text
+    return {BLOB_REF_KEY: store.put(data), "bytes": len(data)}
+
+
+def externalize_messages(messages, store, min_bytes):
+    """Return messages with every text content of at least min_bytes moved to the store.
+
+    Messages and content parts that are changed are copied, the rest are
+    shared with the input, which is never modified.
+    """
+    result = []
+    for msg in messages:
+        if not isinstance(msg, dict):
+            result.append(msg)
+            continue
+        content = msg.get("content")
+        if isinstance(content, str):
+            new_content = _externalize_text(content, store, min_bytes)
+        elif isinstance(content, list):
+            parts = []
+            for part in content:
+                if isinstance(part, dict) and isinstance(part.get("text"), str):
+                    text = _externalize_text(part["text"], store, min_bytes)
+                    if text is not part["text"]:
+                        part = {**part, "text": text}
+                parts.append(part)
+            changed = any(new is not old for new, old in zip(parts, content))
+            new_content = parts if changed else content
+        else:
+            new_content = content
+        if new_content is not content:
+            msg = {**msg, "content": new_content}
+        result.append(msg)
+    return result
+
+
+def resolve_blob_refs(obj, store):
+    """Replace every blob reference in a decoded record with the stored text.
+
+    References that aren't a digest, or whose blob is missing, are left as they are.
+    """
+    if isinstance(obj, dict):
+        if BLOB_REF_KEY in obj:
+            try:
+                return store.get(obj[BLOB_REF_KEY]).decode("utf-8")
+            except (ValueError, OSError):
+                return obj
+        return {k: resolve_blob_refs(v, store) for k, v in obj.items()}
+    if isinstance(obj, list):
+        return [resolve_blob_refs(v, store) for v in obj]
+    return obj
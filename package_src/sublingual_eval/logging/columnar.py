@@ -0,0 +1,135 @@
+import json
+import os
+
+try:
+    import pyarrow
+    import pyarrow.ipc
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+from sublingual_eval.logging.reader import RecordDecoder
+from sublingual_eval.logging.segments import iter_segment_lines
+from sublingual_eval.logging.serialization import to_jsonable
+from sublingual_eval.logging.sqlite_sink import record_columns
+
+# Records are converted and written this many at a time (one row group each)
+ROWS_PER_BATCH = 10000
+
+FORMATS = {".parquet": "parquet", ".arrow": "arrow", ".feather": "arrow", ".ipc": "arrow"}
+
+# Top level fields stored as JSON text, since their shape varies by provider
+# and call; DuckDB's json functions and pandas' json.loads read them
+JSON_FIELDS = (
+    "messages",
+    "response",
+    "usage",
+    "grammar_result",
+    "symbolic_mappings",
+    "stack_trace",
+    "call_parameters",
+    "extra_info",
+)
+
+
+def arrow_schema():
+    return pyarrow.schema(
+        [
+            ("log_id", pyarrow.string()),
+            ("session_id", pyarrow.string()),
+            ("timestamp", pyarrow.timestamp("s", tz="UTC")),
+            ("model", pyarrow.string()),
+            ("call_site", pyarrow.string()),
+            ("duration_ms", pyarrow.float64()),
+            ("prompt_tokens", pyarrow.int64()),
+            ("completion_tokens", pyarrow.int64()),
+            ("total_tokens", pyarrow.int64()),
+        ]
+        + [(field, pyarrow.string()) for field in JSON_FIELDS]
+        # Anything else in the record, so the conversion loses nothing
+        + [("other_fields", pyarrow.string())]
+    )
+
+
+def _to_json(value):
+    if value is None:
+        return None
+    return json.dumps(value, default=to_jsonable)
+
+
+def record_row(record):
+    """Flatten a record into the columns of arrow_schema"""
+    row = record_columns(record)
+    for field in JSON_FIELDS:
+        row[field] = _to_json(record.get(field))
+    known = set(row)
+    other = {k: v for k, v in record.items() if k not in known}
+    row["other_fields"] = _to_json(other) if other else None
+    return row
+
+
+def format_for_path(path):
+    """Return "parquet" or "arrow" based on the output file's extension, or None"""
+    return FORMATS.get(os.path.splitext(path)[1].lower())
+
+
+class ColumnarWriter:
+    """Writes records to a Parquet or Arrow IPC file in batches of typed columns"""
+
+    def __init__(self, path, fmt):
+        if pyarrow is None:
+            raise ValueError("converting logs requires the pyarrow package")
+        self.schema = arrow_schema()
+        self.rows = 0
+        self._pending = []
+        if fmt == "parquet":
+            self._writer = pyarrow.parquet.ParquetWriter(path, self.schema, compression="zstd")
+        elif fmt == "arrow":
+            self._writer = pyarrow.ipc.new_file(
+                path, self.schema, options=pyarrow.ipc.IpcWriteOptions(compression="zstd")
+            )
+        else:
+            raise ValueError(f"format must be parquet or arrow, got {fmt!r}")
+
+    def write(self, record):
+        self._pending.append(record_row(record))
+        if len(self._pending) >= ROWS_PER_BATCH:
+            self._write_pending()
+
+    def _write_pending(self):
+        if not self._pending:
+            return
+        columns = {
+            name: [row[name] for row in self._pending] for name in self.schema.names
+        }
+        self._writer.write_table(pyarrow.table(columns, schema=self.schema))
+        self.rows += len(self._pending)
+        self._pending = []
+
+    def close(self):
+        self._write_pending()
+        self._writer.close()
+
+
+def convert_segments(paths, output, fmt):
+    """Convert the LLM call records in log segments to one columnar file.
+
+    Returns the number of records written and the number of unreadable
+    lines skipped.
+    """
+    writer = ColumnarWriter(output, fmt)
+    skipped = 0
+    try:
+        for path in paths:
+            decoder = RecordDecoder(os.path.dirname(path))
+            for line in iter_segment_lines(path):
+                try:
+                    record = decoder.decode(line)
+                except ValueError:
+                    skipped += 1
+                    continue
+                if record is not None:
+                    writer.write(record)
+    finally:
+        writer.close()
+    return writer.rows, skipped
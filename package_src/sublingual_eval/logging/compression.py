@@ -0,0 +1,59 @@
+import gzip
+import lzma
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+class Codec:
+    """A block compression format for log segments.
+
+    Every block is a complete compressed stream on its own, so a reader can
+    seek to any block and decompress it without touching the rest of the
+    file, while the whole file is still a valid multi-stream archive.
+    """
+
+    def __init__(self, name, extension, compress, decompress):
+        self.name = name
+        self.extension = extension
+        self.compress = compress
+        self.decompress = decompress
+
+
+def _zstd_compress(data):
+    return zstandard.ZstdCompressor(level=3).compress(data)
+
+
+def _zstd_decompress(data):
+    # Blocks may be concatenated frames (e.g. a whole segment without an index)
+    reader = zstandard.ZstdDecompressor().stream_reader(data, read_across_frames=True)
+    return reader.read()
+
+
+CODECS = {
+    "gzip": Codec("gzip", ".gz", lambda data: gzip.compress(data, compresslevel=6), gzip.decompress),
+    "lzma": Codec("lzma", ".xz", lzma.compress, lzma.decompress),
+    "zstd": Codec("zstd", ".zst", _zstd_compress, _zstd_decompress),
+}
+
+
+def get_codec(name):
+    """Return the codec called name, raising ValueError if it can't be used here"""
+    codec = CODECS.get(name)
+    if codec is None:
+        raise ValueError(
+            f"compression must be one of {', '.join(CODECS)}, got {name!r}"
+        )
+    if name == "zstd" and zstandard is None:
+        raise ValueError("zstd compression requires the zstandard package")
+    return codec
+
+
+def codec_for_path(path):
+    """Return the codec a segment was written with, or None for plain JSONL"""
+    for codec in CODECS.values():
+        if path.endswith(".jsonl" + codec.extension):
+            return codec
+    return None
@@ -0,0 +1,85 @@
+import logging
+import os
+import random
+import threading
+
+# Set up logging
+logger = logging.getLogger("sublingual")
+
+# Capture levels, from everything to the least; each drops one more feature.
+# Only work done on the calling thread is worth dropping, since that's what
+# the budget measures: source lines, say, are read on the writer thread
+CAPTURE_LEVELS = ("full", "no_grammar", "no_stack", "sampled")
+NO_GRAMMAR = CAPTURE_LEVELS.index("no_grammar")
+NO_STACK = CAPTURE_LEVELS.index("no_stack")
+SAMPLED = CAPTURE_LEVELS.index("sampled")
+
+
+class Governor:
+    """Keeps the CPU time capture spends on the calling thread within a budget.
+
+    The wrappers report how long each capture took, and every window calls
+    the average is compared with budget_us: over it, capture steps down one
+    level, and under half of it, it steps back up. At the last level only
+    sample_rate of the calls are captured, and the calls left out count as
+    costing nothing. Records carry the level they were captured at.
+    """
+
+    def __init__(self, budget_us=200, window=100, sample_rate=0.1):
+        self.budget_ns = budget_us * 1000
+        self.window = max(1, window)
+        self.sample_rate = sample_rate
+        self.level = 0
+        self._calls = 0
+        self._cpu_ns = 0
+        self._lock = threading.Lock()
+
+    def admit(self):
+        """Return the level to capture a call at, or None to skip it"""
+        level = self.level
+        if level >= SAMPLED and random.random() >= self.sample_rate:
+            self.record(0)
+            return None
+        return level
+
+    def record(self, cpu_ns):
+        """Count the CPU time one call's capture took"""
+        with self._lock:
+            self._calls += 1
+            self._cpu_ns += cpu_ns
+            if self._calls < self.window:
+                return
+            average = self._cpu_ns / self._calls
+            self._calls = self._cpu_ns = 0
+            if average > self.budget_ns and self.level < SAMPLED:
+                self.level += 1
+                logger.warning(
+                    "\033[93m[sublingual] Warning:\033[0m Capture took %dµs per call, over its budget of %dµs; capturing at level %s",
+                    average / 1000,
+                    self.budget_ns / 1000,
+                    CAPTURE_LEVELS[self.level],
+                )
+            elif average < self.budget_ns / 2 and self.level > 0:
+                self.level -= 1
+
+    def stats(self):
+        return {"capture_level": CAPTURE_LEVELS[self.level]}
+
+
+# The Governor init() built, for sublingual_eval.stats()
+_governor = None
+
+
+def governor_from_env():
+    """Build the Governor configured by SUBL_CAPTURE_BUDGET_US, or None if there is no budget"""
+    global _governor
+    try:
+        budget_us = int(os.getenv("SUBL_CAPTURE_BUDGET_US", "0"))
+    except ValueError:
+        logger.warning(
+            "\033[93m[sublingual] Warning:\033[0m Ignoring SUBL_CAPTURE_BUDGET_US %r, expected microseconds",
+            os.getenv("SUBL_CAPTURE_BUDGET_US"),
+        )
+        budget_us = 0
+    _governor = Governor(budget_us=budget_us) if budget_us > 0 else None
+    return _governor
@@ -0,0 +1,302 @@
+import gzip
+import itertools
+import logging
+import os
+import queue
+import socket
+import threading
+import time
+import urllib.error
+import urllib.request
+from sublingual_eval.logging.serialization import get_serializer
+from sublingual_eval.logging.sinks import Sink
+
+# Set up logging
+logger = logging.getLogger("sublingual")
+
+SPOOL_DIR_NAME = "spool"
+SPOOL_EXTENSION = ".jsonl.gz"
+# Suffix of a spooled batch a process is sending, after its pid
+SENDING_EXTENSION = ".sending"
+
+# Queue item that stops the sender thread
+_STOP = object()
+
+
+def spool_dir(logs_dir):
+    """Batches that couldn't be sent wait next to the logs directory, e.g. .sublingual/spool"""
+    return os.path.join(os.path.dirname(os.path.abspath(logs_dir)), SPOOL_DIR_NAME)
+
+
+def _pid_alive(pid):
+    if os.name == "nt":
+        # os.kill would terminate it; never take over another process's batch
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except OSError:
+        # It exists but belongs to someone else
+        return True
+    return True
+
+
+class HttpSink(Sink):
+    """POSTs each group of records to a collector, e.g. another dashboard's /api/ingest.
+
+    The body is the group as gzip-compressed JSON lines. Records are
+    serialized again here without the storage transforms, since the
+    collector can't see this host's blob store or side tables, and each
+    record is tagged with the host it came from.
+
+    The log writer thread never waits on the network: it hands each body
+    to the sink's own sender thread, and spills it to the spool directory
+    when max_queued_batches are already waiting to be sent. A batch that
+    can't be sent is spooled too, and spooled batches are retried, oldest
+    first, with exponential backoff between attempts. While batches are
+    waiting, new ones are spooled behind them so the collector receives
+    them in order. The spool is capped at max_spool_bytes, counted from
+    disk once and then kept up to date as batches are spooled and sent;
+    batches beyond that are dropped, as are batches the collector rejects
+    outright (a 4xx other than 408 or 429). Batches a killed process was
+    in the middle of sending are taken back into the spool.
+    """
+
+    name = "http"
+
+    def __init__(
+        self,
+        url,
+        token=None,
+        timeout_s=5,
+        max_spool_bytes=256 * 1024 * 1024,
+        serializer=None,
+        min_backoff_s=1,
+        max_backoff_s=300,
+        max_queued_batches=64,
+    ):
+        self.url = url
+        self._token = token
+        self._timeout = timeout_s
+        self._max_spool_bytes = max_spool_bytes
+        self._serializer = serializer or get_serializer("json")
+        self._min_backoff = min_backoff_s
+        self._max_backoff = max_backoff_s
+        self._max_queued_batches = max_queued_batches
+        self._host = socket.gethostname()
+        self._spool_dirs = set()
+        self._reset()
+
+    def _reset(self):
+        self._backoff = self._min_backoff
+        self._retry_at = 0
+        self._spool_seq = itertools.count()
+        self._spool_bytes = {}
+        self._spool_lock = threading.Lock()
+        self._queue = queue.Queue(maxsize=self._max_queued_batches)
+        self._thread = None
+
+    def write(self, logs_dir, records, lines):
+        records = [r for r in records if "record_type" not in r]
+        if not records:
+            return
+        body = gzip.compress(
+            b"".join(
+                self._serializer.dumps({**r, "source_host": self._host}) + b"\n"
+                for r in records
+            ),
+            compresslevel=6,
+        )
+        directory = spool_dir(logs_dir)
+        self._spool_dirs.add(directory)
+        # Stamped now so a batch spooled later still sorts by when it was written
+        batch = (directory, body, time.time_ns())
+        if self._thread is None:
+            self._thread = threading.Thread(
+                target=self._run, name="sublingual-http-sink", daemon=True
+            )
+            self._thread.start()
+        try:
+            self._queue.put_nowait(batch)
+        except queue.Full:
+            self._spool(*batch)
+
+    def close(self):
+        """Give the sender thread up to timeout_s to finish, then spool what it didn't get to"""
+        if self._thread is None:
+            return
+        try:
+            self._queue.put(_STOP, timeout=self._timeout)
+        except queue.Full:
+            pass
+        self._thread.join(self._timeout)
+        while True:
+            try:
+                batch = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if batch is not _STOP:
+                self._spool(*batch)
+        self._thread = None
+
+    def after_fork_in_child(self):
+        # The sender thread and the batches it was holding stay with the parent
+        self._reset()
+
+    def _run(self):
+        while True:
+            # Retry the spool every so often even when nothing new is written
+            wait = max(1, self._retry_at - time.monotonic()) if self._spool_dirs else None
+            try:
+                batch = self._queue.get(timeout=wait)
+            except queue.Empty:
+                batch = None
+            if batch is _STOP:
+                return
+            try:
+                if batch is None:
+                    for directory in list(self._spool_dirs):
+                        self._send_spooled(directory)
+                else:
+                    self._send(*batch)
+            except Exception as e:
+                logger.error("\033[92m\033[94m[sublingual]\033[0m Error sending logs: %s", e)
+            finally:
+                if batch is not None:
+                    self._queue.task_done()
+
+    def _send(self, directory, body, created_ns):
+        if not self._spooled(directory):
+            try:
+                self._post(body)
+                return
+            except ValueError as e:
+                logger.error("\033[92m\033[94m[sublingual]\033[0m Dropping logs: %s", e)
+                return
+            except OSError as e:
+                self._failed(e)
+        # Behind the batches already waiting, then send them all if it's time to
+        self._spool(directory, body, created_ns)
+        self._send_spooled(directory)
+
+    def _post(self, body):
+        request = urllib.request.Request(
+            self.url,
+            data=body,
+            method="POST",
+            headers={
+                "Content-Type": "application/x-ndjson",
+                "Content-Encoding": "gzip",
+            },
+        )
+        if self._token:
+            request.add_header("Authorization", f"Bearer {self._token}")
+        try:
+            with urllib.request.urlopen(request, timeout=self._timeout) as response:
+                response.read()
+        except urllib.error.HTTPError as e:
+            if 400 <= e.code < 500 and e.code not in (408, 429):
+                # Sending it again won't help
+                raise ValueError(f"{self.url} rejected the logs: {e.code} {e.reason}")
+            raise
+        self._backoff = self._min_backoff
+
+    def _failed(self, error):
+        logger.error(
+            "\033[92m\033[94m[sublingual]\033[0m Could not send logs to %s, retrying in %ss: %s",
+            self.url,
+            self._backoff,
+            error,
+        )
+        self._retry_at = time.monotonic() + self._backoff
+        self._backoff = min(self._backoff * 2, self._max_backoff)
+
+    def _spooled(self, directory):
+        """The batches waiting in directory, oldest first, reclaiming any a killed process was sending"""
+        try:
+            names = os.listdir(directory)
+        except FileNotFoundError:
+            return []
+        spooled = []
+        for name in names:
+            if name.endswith(SPOOL_EXTENSION):
+                spooled.append(name)
+            elif name.endswith(SENDING_EXTENSION):
+                original, _, pid = name[: -len(SENDING_EXTENSION)].rpartition(".")
+                if not pid.isdigit() or int(pid) == os.getpid() or _pid_alive(int(pid)):
+                    continue
+                path = os.path.join(directory, original)
+                try:
+                    os.rename(os.path.join(directory, name), path)
+                    self._count_spooled(directory, os.path.getsize(path))
+                except FileNotFoundError:
+                    # Reclaimed by another process
+                    continue
+                spooled.append(original)
+        return [os.path.join(directory, name) for name in sorted(spooled)]
+
+    def _spool_size(self, directory):
+        """Bytes waiting in the spool, counted from disk the first time"""
+        size = self._spool_bytes.get(directory)
+        if size is None:
+            size = 0
+            for path in self._spooled(directory):
+                try:
+                    size += os.path.getsize(path)
+                except FileNotFoundError:
+                    # Sent by another process meanwhile
+                    pass
+            with self._spool_lock:
+                size = self._spool_bytes.setdefault(directory, size)
+        return size
+
+    def _count_spooled(self, directory, n):
+        with self._spool_lock:
+            if directory in self._spool_bytes:
+                self._spool_bytes[directory] = max(0, self._spool_bytes[directory] + n)
+
+    def _send_spooled(self, directory):
+        """Retry spooled batches if it's time to; return whether the spool is now empty"""
+        spooled = self._spooled(directory)
+        if not spooled:
+            with self._spool_lock:
+                self._spool_bytes[directory] = 0
+            return True
+        if time.monotonic() < self._retry_at:
+            return False
+        for path in spooled:
+            # Claim the batch so other processes sharing the spool skip it
+            claimed = f"{path}.{os.getpid()}{SENDING_EXTENSION}"
+            try:
+                os.rename(path, claimed)
+            except FileNotFoundError:
+                continue
+            try:
+                with open(claimed, "rb") as f:
+                    body = f.read()
+                self._post(body)
+            except ValueError as e:
+                logger.error("\033[92m\033[94m[sublingual]\033[0m Dropping spooled logs: %s", e)
+                os.remove(claimed)
+                self._count_spooled(directory, -len(body))
+                continue
+            except OSError as e:
+                os.rename(claimed, path)
+                self._failed(e)
+                return False
+            os.remove(claimed)
+            self._count_spooled(directory, -len(body))
+        return True
+
+    def _spool(self, directory, body, created_ns):
+        os.makedirs(directory, exist_ok=True)
+        if self._spool_size(directory) + len(body) > self._max_spool_bytes:
+            raise OSError(f"log spool {directory} is full, dropping {len(body)} bytes")
+        # Named by time so batches from every process are retried in order
+        name = f"{created_ns:020d}_{os.getpid()}_{next(self._spool_seq)}{SPOOL_EXTENSION}"
+        path = os.path.join(directory, name)
+        with open(path + ".tmp", "wb") as f:
+            f.write(body)
+        os.replace(path + ".tmp", path)
+        self._count_spooled(directory, len(body))
@@ -0,0 +1,140 @@
+import hashlib
+import json
+import os
+
+INTERNED_DIR_NAME = "interned"
+STACKS_TABLE = "stacks.jsonl"
+GRAMMARS_TABLE = "grammars.jsonl"
+
+
+def interned_dir(logs_dir):
+    """Side tables live next to the logs directory, e.g. .sublingual/interned"""
+    return os.path.join(os.path.dirname(os.path.abspath(logs_dir)), INTERNED_DIR_NAME)
+
+
+def stable_id(value):
+    """A hash of a JSON value that is the same in every process and run"""
+    data = json.dumps(value, sort_keys=True, separators=(",", ":")).encode("utf-8")
+    return hashlib.sha256(data).hexdigest()[:16]
+
+
+class InternTable:
+    """Append-only side table mapping stable ids to JSON values.
+
+    Each value is appended once per process the first time it is interned.
+    Ids are content hashes, so entries written by different processes for the
+    same value are identical and readers can keep whichever they see first.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._known = set()
+
+    def intern(self, value, value_id=None):
+        """Store value if this process hasn't yet, and return its id"""
+        if value_id is None:
+            value_id = stable_id(value)
+        if value_id not in self._known:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            line = json.dumps({"id": value_id, "value": value}) + "\n"
+            with open(self.path, "a") as f:
+                f.write(line)
+            self._known.add(value_id)
+        return value_id
+
+
+class StackTable(InternTable):
+    """Interns stack traces, keyed by their (filename, lineno, function) frames"""
+
+    def __init__(self, path):
+        super().__init__(path)
+        self._ids_by_frames = {}
+
+    def intern_stack(self, stack_trace):
+        frames = tuple((f["filename"], f["lineno"], f["function"]) for f in stack_trace)
+        stack_id = self._ids_by_frames.get(frames)
+        if stack_id is None:
+            stack_id = self.intern(stack_trace, stable_id(frames))
+            self._ids_by_frames[frames] = stack_id
+        return stack_id
+
+
+def split_grammar(grammar):
+    """Split a grammar dict into its skeleton and the InferredVar values it holds.
+
+    The skeleton is the grammar with every InferredVar's value removed; it is
+    the same for every call made from a call site. The values are returned in
+    the order join_grammar puts them back.
+    """
+    values = []
+
+    def strip(node):
+        if isinstance(node, dict):
+            if node.get("type") == "InferredVar" and "value" in node:
+                values.append(node["value"])
+                return {k: v for k, v in node.items() if k != "value"}
+            return {k: strip(v) for k, v in node.items()}
+        if isinstance(node, list):
+            return [strip(v) for v in node]
+        return node
+
+    return strip(grammar), values
+
+
+def join_grammar(skeleton, values):
+    """Inverse of split_grammar"""
+    values = iter(values)
+
+    def fill(node):
+        if isinstance(node, dict):
+            if node.get("type") == "InferredVar" and "value" not in node:
+                return {**node, "value": next(values, None)}
+            return {k: fill(v) for k, v in node.items()}
+        if isinstance(node, list):
+            return [fill(v) for v in node]
+        return node
+
+    return fill(skeleton)
+
+
+class GrammarTable(InternTable):
+    """Interns grammar skeletons, remembering the last one seen at each call site"""
+
+    def __init__(self, path):
+        super().__init__(path)
+        self._by_call_site = {}
+
+    def intern_grammar(self, skeleton, call_site=None):
+        cached = self._by_call_site.get(call_site)
+        # Comparing against the call site's last skeleton is much cheaper
+        # than hashing it, and is almost always a hit
+        if cached is not None and cached[0] == skeleton:
+            return cached[1]
+        grammar_id = self.intern(skeleton)
+        if call_site is not None:
+            self._by_call_site[call_site] = (skeleton, grammar_id)
+        return grammar_id
+
+
+def load_intern_table(path):
+    """Read a side table into a dict of id -> value, skipping torn lines"""
+    table = {}
+    try:
+        with open(path) as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue
+                table.setdefault(entry["id"], entry["value"])
+    except FileNotFoundError:
+        pass
+    return table
+
+
+def replace_key(record, old_key, new_key, new_value):
+    """Return a copy of record with old_key swapped for new_key, keeping key order"""
+    return {
+        (new_key if k == old_key else k): (new_value if k == old_key else v)
+        for k, v in record.items()
+    }
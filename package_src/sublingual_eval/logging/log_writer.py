@@ -0,0 +1,684 @@
+import asyncio
+import atexit
+import logging
+import os
+import queue
+import random
+import threading
+import time
+import weakref
+from sublingual_eval.logging.blob_store import BlobStore, blobs_dir, externalize_messages
+from sublingual_eval.logging.compression import get_codec
+from sublingual_eval.logging.interning import (
+    GRAMMARS_TABLE,
+    STACKS_TABLE,
+    GrammarTable,
+    StackTable,
+    interned_dir,
+    replace_key,
+    split_grammar,
+)
+from sublingual_eval.logging.http_sink import HttpSink
+from sublingual_eval.logging.overhead import phase_stats, record_phase
+from sublingual_eval.logging.payload_limits import OVERSIZE_MODES, PayloadLimiter
+from sublingual_eval.logging.serialization import get_serializer, serializer_from_env
+from sublingual_eval.logging.sinks import JsonlSink
+from sublingual_eval.logging.sqlite_sink import SqliteSink
+
+# Set up logging
+logger = logging.getLogger("sublingual")
+
+
+def _env_int(name, default):
+    try:
+        return int(os.getenv(name, default))
+    except ValueError:
+        return default
+
+
+# How hard each group commit pushes records towards the disk:
+#   none  - leave them in the file buffer until it fills up or is closed
+#   flush - hand them to the OS after every group
+#   fsync - flush and fsync after every group
+DURABILITY_LEVELS = ("none", "flush", "fsync")
+
+# What submit does when the queue is full:
+#   block       - wait up to block_timeout_ms for room, then drop the record
+#   drop_newest - drop the record being submitted
+#   drop_oldest - drop the oldest queued record to make room
+#   sample      - once the queue is half full, keep a shrinking share of
+#                 records (none when full)
+OVERLOAD_POLICIES = ("block", "drop_newest", "drop_oldest", "sample")
+
+# How often asubmit checks for room under the block policy, backing off
+# from the first interval to the second
+ASUBMIT_MIN_POLL_S = 0.001
+ASUBMIT_MAX_POLL_S = 0.05
+
+# Counters written to the log in capture_stats records
+STATS_COUNTERS = ("dropped", "sampled_out", "delayed", "write_errors")
+
+
+class _Flush:
+    """Queue marker that is acknowledged once everything before it is written"""
+
+    def __init__(self):
+        self.done = threading.Event()
+
+
+_STOP = object()
+
+
+class LogWriter:
+    """Stores logged records from a dedicated background thread.
+
+    Callers only enqueue the record; serialization and file I/O happen on the
+    writer thread so disk latency never lands on the request path. Records are
+    committed in groups of up to batch_size records or batch_interval_ms
+    milliseconds, and each group is handed to every sink at once. By default
+    the only sink is a JsonlSink built from durability, max_segment_bytes,
+    max_segment_age_s and compression, which writes each group with a single
+    write to the open segment of its logs directory.
+
+    With blob_min_bytes set, message contents of at least that many bytes are
+    stored once in the content-addressed blob store next to the logs
+    directory and records only reference them by digest. With intern_stacks,
+    each distinct stack trace is written once to a side table and records
+    carry its stack_id instead of the frames. intern_grammars does the same
+    for grammar results: the skeleton is stored once per call site and
+    records carry its grammar_id plus the InferredVar values.
+
+    With max_field_bytes or max_var_bytes set, strings and InferredVar values
+    over the limit are truncated, keeping their length and sha256, or with
+    oversize="blob" moved to the blob store, so that no record grows without
+    bound. Blob references only go in the local JSON lines; the records
+    handed to the sinks are always truncated.
+
+    Records may still hold SDK objects when submitted; a finalize callable
+    passed with the record runs on the writer thread to turn it into its
+    logged form, and the serializer encodes whatever SDK objects remain.
+
+    submit never raises, and never blocks for longer than block_timeout_ms
+    (asubmit, for coroutines, never blocks the event loop at all):
+    when the queue is full, records are dropped according to the overload
+    policy. Dropped, sampled out, delayed and unwritable records are counted,
+    and whenever the counts change a capture_stats record with the totals is
+    written to the log, at most once every stats_interval_s seconds and once
+    more on close. With overhead_stats, a capture_overhead record with the
+    time spent in each capture phase (see overhead.py) is written alongside.
+
+    The writer is fork safe: the segment buffers are flushed before a fork,
+    and a forked child starts with an empty queue, no writer thread, no open
+    segments and zeroed counters, so it writes its own segments named after
+    its own pid. This lets apps preloaded by gunicorn or uWSGI be captured.
+    """
+
+    def __init__(
+        self,
+        max_queue_size=10000,
+        batch_size=256,
+        batch_interval_ms=100,
+        durability="flush",
+        max_segment_bytes=64 * 1024 * 1024,
+        max_segment_age_s=0,
+        compression=None,
+        blob_min_bytes=0,
+        intern_stacks=False,
+        intern_grammars=False,
+        serializer=None,
+        overload="block",
+        block_timeout_ms=1000,
+        stats_interval_s=60,
+        sinks=None,
+        max_field_bytes=0,
+        max_var_bytes=0,
+        oversize="truncate",
+        overhead_stats=False,
+    ):
+        if durability not in DURABILITY_LEVELS:
+            raise ValueError(
+                f"durability must be one of {', '.join(DURABILITY_LEVELS)}, got {durability!r}"
+            )
+        if overload not in OVERLOAD_POLICIES:
+            raise ValueError(
+                f"overload must be one of {', '.join(OVERLOAD_POLICIES)}, got {overload!r}"
+            )
+        self._queue = queue.Queue(maxsize=max_queue_size)
+        self._max_queue_size = max_queue_size
+        self._overload = overload
+        self._block_timeout = max(0, block_timeout_ms) / 1000
+        self._stats_interval = stats_interval_s
+        self._stats = dict.fromkeys(STATS_COUNTERS, 0)
+        self._stats_lock = threading.Lock()
+        self._stats_written = dict(self._stats)
+        self._stats_written_at = time.monotonic()
+        self._overhead_stats = overhead_stats
+        self._phases_written = None
+        self._logs_dirs = set()
+        self._batch_size = max(1, batch_size)
+        self._batch_interval = max(0, batch_interval_ms) / 1000
+        if compression:
+            # Fail fast on an unknown or unavailable codec
+            get_codec(compression)
+        if sinks is None:
+            sinks = [
+                JsonlSink(durability, max_segment_bytes, max_segment_age_s, compression)
+            ]
+        self._sinks = list(sinks)
+        self._blob_min_bytes = blob_min_bytes
+        self._blob_stores = {}
+        self._limiter = None
+        if max_field_bytes or max_var_bytes:
+            self._limiter = PayloadLimiter(max_field_bytes, max_var_bytes, oversize)
+        self._intern_stacks = intern_stacks
+        self._intern_grammars = intern_grammars
+        self._side_tables = {}
+        self._serializer = serializer or get_serializer("json")
+        self._thread = None
+        self._lock = threading.Lock()
+        # Held by the writer thread while it touches the segments
+        self._write_lock = threading.Lock()
+        self._closed = False
+        _writers.add(self)
+
+    def _ensure_started(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(
+                    target=self._run, name="sublingual-log-writer", daemon=True
+                )
+                self._thread.start()
+
+    def submit(self, logs_dir, record, finalize=None):
+        """Queue a record to be written to the sinks for logs_dir"""
+        item = self._offer(logs_dir, record, finalize)
+        if item is not None:
+            self._submit_overloaded(item)
+
+    async def asubmit(self, logs_dir, record, finalize=None):
+        """Like submit, but never blocks the event loop.
+
+        Queueing a record doesn't block unless the queue is full under the
+        block policy; this coroutine then polls for room with asyncio.sleep,
+        so waiting ties up neither the event loop nor its executor threads.
+        """
+        item = self._offer(logs_dir, record, finalize)
+        if item is None:
+            return
+        if self._overload != "block":
+            self._submit_overloaded(item)
+            return
+        self._count("delayed", logs_dir)
+        deadline = time.monotonic() + self._block_timeout
+        delay = ASUBMIT_MIN_POLL_S
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            await asyncio.sleep(min(delay, remaining))
+            try:
+                self._queue.put_nowait(item)
+                return
+            except queue.Full:
+                delay = min(delay * 2, ASUBMIT_MAX_POLL_S)
+        self._count("dropped", logs_dir)
+
+    def _offer(self, logs_dir, record, finalize):
+        """Queue the record if there's room; return it as a queue item if there isn't"""
+        if self._closed:
+            return None
+        self._ensure_started()
+        item = (logs_dir, record, finalize)
+        if self._overload == "sample" and self._max_queue_size > 0:
+            # Keep everything up to half full, then fewer and fewer records
+            fill = self._queue.qsize() / self._max_queue_size
+            if fill >= 0.5 and random.random() >= 2 * (1 - fill):
+                self._count("sampled_out", logs_dir)
+                return None
+        try:
+            self._queue.put_nowait(item)
+            return None
+        except queue.Full:
+            return item
+
+    def _submit_overloaded(self, item):
+        """Apply the overload policy to a record that found the queue full"""
+        logs_dir = item[0]
+        if self._overload == "block":
+            self._count("delayed", logs_dir)
+            try:
+                self._queue.put(item, timeout=self._block_timeout)
+                return
+            except queue.Full:
+                pass
+        elif self._overload == "drop_oldest":
+            while self._drop_oldest():
+                self._count("dropped", logs_dir)
+                try:
+                    self._queue.put_nowait(item)
+                    return
+                except queue.Full:
+                    pass
+        self._count("dropped", logs_dir)
+
+    def _drop_oldest(self):
+        """Remove the oldest queued record, leaving flush and stop markers alone"""
+        q = self._queue
+        with q.mutex:
+            for i, item in enumerate(q.queue):
+                if isinstance(item, tuple):
+                    del q.queue[i]
+                    q.not_full.notify()
+                    return True
+        return False
+
+    def _count(self, counter, logs_dir=None, n=1):
+        with self._stats_lock:
+            self._stats[counter] += n
+            if logs_dir is not None:
+                self._logs_dirs.add(logs_dir)
+
+    def stats(self):
+        """Return the overload counters and the current queue depth"""
+        with self._stats_lock:
+            stats = dict(self._stats)
+        stats["queue_depth"] = self._queue.qsize()
+        return stats
+
+    def flush(self, timeout=None):
+        """Block until every record queued so far has been written"""
+        if self._thread is None or not self._thread.is_alive():
+            return True
+        marker = _Flush()
+        deadline = None if timeout is None else time.monotonic() + timeout
+        try:
+            self._queue.put(marker, timeout=timeout)
+        except queue.Full:
+            return False
+        if deadline is not None:
+            timeout = max(0, deadline - time.monotonic())
+        return marker.done.wait(timeout)
+
+    async def aflush(self, timeout=None):
+        """Wait until every record queued so far has been written, without blocking the event loop"""
+        return await asyncio.to_thread(self.flush, timeout)
+
+    def close(self, timeout=5.0):
+        """Write out the remaining records and stop the writer thread"""
+        if self._closed:
+            return
+        self._closed = True
+        if self._thread is None or not self._thread.is_alive():
+            return
+        deadline = time.monotonic() + timeout
+        try:
+            self._queue.put(_STOP, timeout=timeout)
+        except queue.Full:
+            logger.warning(
+                "\033[93m[sublingual] Warning:\033[0m Log writer still busy after %ss; %d queued records were not written",
+                timeout,
+                self._queue.qsize(),
+            )
+            return
+        self._thread.join(max(0, deadline - time.monotonic()))
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            batch = []
+            markers = []
+            stop = False
+            deadline = time.monotonic() + self._batch_interval
+            while True:
+                if item is _STOP:
+                    stop = True
+                    break
+                if isinstance(item, _Flush):
+                    markers.append(item)
+                    break
+                batch.append(item)
+                if len(batch) >= self._batch_size:
+                    break
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=timeout)
+                except queue.Empty:
+                    break
+
+            with self._write_lock:
+                self._commit(batch)
+                if stop or time.monotonic() - self._stats_written_at >= self._stats_interval:
+                    self._write_stats()
+                if markers or stop:
+                    self._call_sinks("flush")
+                if stop:
+                    self._call_sinks("close")
+            for marker in markers:
+                marker.done.set()
+            if stop:
+                return
+
+    def _before_fork(self):
+        # Wait for the group commit in progress, then push the buffered bytes
+        # to the OS so the child doesn't inherit (and later rewrite) them
+        self._write_lock.acquire()
+        self._stats_lock.acquire()
+        self._lock.acquire()
+        for sink in self._sinks:
+            try:
+                sink.before_fork()
+            except Exception:
+                pass
+
+    def _after_fork_in_parent(self):
+        self._lock.release()
+        self._stats_lock.release()
+        self._write_lock.release()
+
+    def _after_fork_in_child(self):
+        for sink in self._sinks:
+            try:
+                sink.after_fork_in_child()
+            except Exception:
+                pass
+        self._queue = queue.Queue(maxsize=self._max_queue_size)
+        self._thread = None
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self._stats = dict.fromkeys(STATS_COUNTERS, 0)
+        self._stats_lock = threading.Lock()
+        self._stats_written = dict(self._stats)
+        self._stats_written_at = time.monotonic()
+        self._phases_written = None
+        self._logs_dirs = set()
+
+    def _commit(self, batch):
+        """Hand a group of records to every sink, one call per logs directory"""
+        groups = {}
+        for logs_dir, record, finalize in batch:
+            self._logs_dirs.add(logs_dir)
+            try:
+                start = time.perf_counter_ns()
+                if finalize is not None:
+                    record = finalize(record)
+                    finalized = time.perf_counter_ns()
+                    record_phase("finalize", finalized - start)
+                    start = finalized
+                # Sinks get oversized values truncated; blob mode only applies
+                # to the local lines, see _prepare
+                capped = record if self._limiter is None else self._limiter.limit(record)
+                line = self._serializer.dumps(self._prepare(logs_dir, record, capped)) + b"\n"
+                record_phase("serialize", time.perf_counter_ns() - start)
+            except Exception as e:
+                logger.error(
+                    "\033[92m\033[94m[sublingual]\033[0m Error serializing log record: %s", e
+                )
+                self._count("write_errors")
+                continue
+            records, lines = groups.setdefault(logs_dir, ([], []))
+            records.append(capped)
+            lines.append(line)
+
+        for logs_dir, (records, lines) in groups.items():
+            start = time.perf_counter_ns()
+            self._write(logs_dir, records, lines)
+            record_phase("write", time.perf_counter_ns() - start)
+
+    def _write(self, logs_dir, records, lines):
+        for sink in self._sinks:
+            try:
+                sink.write(logs_dir, records, lines)
+            except Exception as e:
+                logger.error(
+                    "\033[92m\033[94m[sublingual]\033[0m Error writing log records to %s: %s",
+                    sink.name,
+                    e,
+                )
+                self._count("write_errors", n=len(lines))
+
+    def _call_sinks(self, method):
+        for sink in self._sinks:
+            try:
+                getattr(sink, method)()
+            except Exception as e:
+                logger.error(
+                    "\033[92m\033[94m[sublingual]\033[0m Error in %s of log sink %s: %s",
+                    method,
+                    sink.name,
+                    e,
+                )
+
+    def _write_stats(self):
+        """Log the overload counters, and the overhead summary if enabled, when they changed"""
+        self._stats_written_at = time.monotonic()
+        with self._stats_lock:
+            stats = dict(self._stats)
+            logs_dirs = list(self._logs_dirs)
+        records = []
+        if stats != self._stats_written:
+            self._stats_written = stats
+            records.append(
+                {
+                    "record_type": "capture_stats",
+                    "timestamp": int(time.time()),
+                    "pid": os.getpid(),
+                    "overload": self._overload,
+                    "queue_size": self._max_queue_size,
+                    "queue_depth": self._queue.qsize(),
+                    **stats,
+                }
+            )
+        if self._overhead_stats:
+            phases = phase_stats()
+            if phases != self._phases_written:
+                self._phases_written = phases
+                records.append(
+                    {
+                        "record_type": "capture_overhead",
+                        "timestamp": int(time.time()),
+                        "pid": os.getpid(),
+                        "phases": phases,
+                    }
+                )
+        for record in records:
+            line = self._serializer.dumps(record) + b"\n"
+            for logs_dir in logs_dirs:
+                self._write(logs_dir, [record], [line])
+
+    def _prepare(self, logs_dir, record, capped):
+        """Apply the configured storage transforms to a record before it is serialized.
+
+        capped is the record with oversized values truncated; in blob mode
+        they are moved to this host's blob store instead, which the other
+        sinks can't see.
+        """
+        if capped is not record and self._limiter.mode == "blob":
+            record = self._limiter.limit(record, self._blob_store(logs_dir))
+        else:
+            record = capped
+        if self._blob_min_bytes and record.get("messages"):
+            record = {
+                **record,
+                "messages": externalize_messages(
+                    record["messages"], self._blob_store(logs_dir), self._blob_min_bytes
+                ),
+            }
+        if self._intern_grammars and isinstance(record.get("grammar_result"), (list, dict)):
+            # Must run before stack interning, which removes the call site
+            record = self._intern_grammar(logs_dir, record)
+        if self._intern_stacks and "stack_trace" in record:
+            table = self._side_table(logs_dir, StackTable, STACKS_TABLE)
+            stack_id = table.intern_stack(record["stack_trace"])
+            record = replace_key(record, "stack_trace", "stack_id", stack_id)
+        return record
+
+    def _blob_store(self, logs_dir):
+        store = self._blob_stores.get(logs_dir)
+        if store is None:
+            store = self._blob_stores[logs_dir] = BlobStore(blobs_dir(logs_dir))
+        return store
+
+    def _intern_grammar(self, logs_dir, record):
+        table = self._side_table(logs_dir, GrammarTable, GRAMMARS_TABLE)
+        skeleton, values = split_grammar(record["grammar_result"])
+        stack = record.get("stack_trace")
+        call_site = (stack[-1]["filename"], stack[-1]["lineno"]) if stack else None
+        grammar_id = table.intern_grammar(skeleton, call_site)
+        interned = {}
+        for k, v in record.items():
+            if k == "grammar_result":
+                interned["grammar_id"] = grammar_id
+                interned["grammar_values"] = values
+            else:
+                interned[k] = v
+        return interned
+
+    def _side_table(self, logs_dir, table_cls, name):
+        key = (logs_dir, name)
+        table = self._side_tables.get(key)
+        if table is None:
+            table = table_cls(os.path.join(interned_dir(logs_dir), name))
+            self._side_tables[key] = table
+        return table
+
+
+_writers = weakref.WeakSet()
+# The writers prepared for the fork in progress
+_forking = []
+
+
+def _before_fork():
+    _forking[:] = list(_writers)
+    for writer in _forking:
+        writer._before_fork()
+
+
+def _after_fork_in_parent():
+    for writer in _forking:
+        writer._after_fork_in_parent()
+    _forking.clear()
+
+
+def _after_fork_in_child():
+    global _log_writer_lock
+    _log_writer_lock = threading.Lock()
+    for writer in _forking:
+        writer._after_fork_in_child()
+    _forking.clear()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(
+        before=_before_fork,
+        after_in_parent=_after_fork_in_parent,
+        after_in_child=_after_fork_in_child,
+    )
+
+
+_log_writer = None
+_log_writer_lock = threading.Lock()
+
+
+def _sinks_from_env(durability, compression, serializer):
+    """Build the sinks named in SUBL_LOG_SINK, e.g. "jsonl,sqlite" """
+    sinks = []
+    for name in os.getenv("SUBL_LOG_SINK", "jsonl").lower().split(","):
+        name = name.strip()
+        if name == "jsonl":
+            sinks.append(
+                JsonlSink(
+                    durability=durability,
+                    max_segment_bytes=_env_int("SUBL_LOG_MAX_BYTES", 64 * 1024 * 1024),
+                    max_segment_age_s=_env_int("SUBL_LOG_MAX_AGE_S", 0),
+                    compression=compression,
+                )
+            )
+        elif name == "sqlite":
+            sinks.append(SqliteSink(durability=durability))
+        elif name == "http":
+            url = os.getenv("SUBL_HTTP_URL")
+            if not url:
+                logger.warning(
+                    "\033[93m[sublingual] Warning:\033[0m SUBL_LOG_SINK includes http but SUBL_HTTP_URL is not set, ignoring it"
+                )
+                continue
+            sinks.append(
+                HttpSink(
+                    url,
+                    token=os.getenv("SUBL_HTTP_TOKEN"),
+                    timeout_s=_env_int("SUBL_HTTP_TIMEOUT_S", 5),
+                    max_spool_bytes=_env_int("SUBL_HTTP_MAX_SPOOL_BYTES", 256 * 1024 * 1024),
+                    serializer=serializer,
+                )
+            )
+        elif name:
+            logger.warning(
+                "\033[93m[sublingual] Warning:\033[0m Unknown log sink %r in SUBL_LOG_SINK, ignoring it",
+                name,
+            )
+    if not sinks:
+        sinks.append(JsonlSink(durability=durability, compression=compression))
+    return sinks
+
+
+def get_log_writer():
+    """Return the process-wide log writer, creating it on first use"""
+    global _log_writer
+    if _log_writer is None:
+        with _log_writer_lock:
+            if _log_writer is None:
+                durability = os.getenv("SUBL_LOG_DURABILITY", "flush").lower()
+                if durability not in DURABILITY_LEVELS:
+                    logger.warning(
+                        "\033[93m[sublingual] Warning:\033[0m Unknown SUBL_LOG_DURABILITY %r, using 'flush'",
+                        durability,
+                    )
+                    durability = "flush"
+                overload = os.getenv("SUBL_LOG_OVERLOAD", "block").lower()
+                if overload not in OVERLOAD_POLICIES:
+                    logger.warning(
+                        "\033[93m[sublingual] Warning:\033[0m Unknown SUBL_LOG_OVERLOAD %r, using 'block'",
+                        overload,
+                    )
+                    overload = "block"
+                compression = os.getenv("SUBL_LOG_COMPRESSION", "").lower() or None
+                if compression:
+                    try:
+                        get_codec(compression)
+                    except ValueError as e:
+                        logger.warning(
+                            "\033[93m[sublingual] Warning:\033[0m %s, writing uncompressed logs", e
+                        )
+                        compression = None
+                oversize = os.getenv("SUBL_OVERSIZE", "truncate").lower()
+                if oversize not in OVERSIZE_MODES:
+                    logger.warning(
+                        "\033[93m[sublingual] Warning:\033[0m Unknown SUBL_OVERSIZE %r, using 'truncate'",
+                        oversize,
+                    )
+                    oversize = "truncate"
+                serializer = serializer_from_env()
+                _log_writer = LogWriter(
+                    max_queue_size=_env_int("SUBL_LOG_QUEUE_SIZE", 10000),
+                    batch_size=_env_int("SUBL_LOG_BATCH_SIZE", 256),
+                    batch_interval_ms=_env_int("SUBL_LOG_BATCH_INTERVAL_MS", 100),
+                    durability=durability,
+                    blob_min_bytes=_env_int("SUBL_BLOB_MIN_BYTES", 0),
+                    intern_stacks=os.getenv("SUBL_INTERN_STACKS", "0") == "1",
+                    intern_grammars=os.getenv("SUBL_INTERN_GRAMMARS", "0") == "1",
+                    serializer=serializer,
+                    overload=overload,
+                    block_timeout_ms=_env_int("SUBL_LOG_BLOCK_TIMEOUT_MS", 1000),
+                    stats_interval_s=_env_int("SUBL_LOG_STATS_INTERVAL_S", 60),
+                    sinks=_sinks_from_env(durability, compression, serializer),
+                    max_field_bytes=_env_int("SUBL_MAX_FIELD_BYTES", 1024 * 1024),
+                    max_var_bytes=_env_int("SUBL_MAX_VAR_BYTES", 64 * 1024),
+                    oversize=oversize,
+                    overhead_stats=os.getenv("SUBL_LOG_OVERHEAD_STATS", "0") == "1",
+                )
+                atexit.register(_log_writer.close)
+    return _log_writer
@@ -2,9 +2,7 @@ import functools
 import logging
 import time
 import inspect
-import json
 import os
-from datetime import datetime
 from openai.resources.chat import chat
 import contextvars
 import uuid
@@ -12,7 +10,14 @@ from sublingual_eval.abstract.grammar import (
     process_messages,
     get_arg_node,
     convert_grammar_to_dict,
+    DeferredGrammar,
 )
+from sublingual_eval.logging.governor import CAPTURE_LEVELS, NO_GRAMMAR, NO_STACK
+from sublingual_eval.logging.log_writer import get_log_writer
+from sublingual_eval.logging.overhead import record_phase
+from sublingual_eval.logging.redaction import redact_content, redact_messages
+from sublingual_eval.logging.serialization import snapshot
+from sublingual_eval.logging.stack_capture import capture_stack, resolve_stack
 
 # Set up logging
 logger = logging.getLogger("sublingual")
@@ -21,82 +26,39 @@ logger = logging.getLogger("sublingual")
 request_id_ctx_var = contextvars.ContextVar("request_id", default=None)
 
 
-# Add this at the top with other imports
-class GrammarEncoder(json.JSONEncoder):
-    def default(self, obj):
-        if hasattr(obj, "__json__"):
-            return obj.__json__()
-        return super().default(obj)
+def write_logged_data(subl_logs_path, logged_data):
+    """Hand the record to the background log writer"""
+    start = time.perf_counter_ns()
+    get_log_writer().submit(subl_logs_path, logged_data, finalize=finalize_logged_data)
+    record_phase("enqueue", time.perf_counter_ns() - start)
 
 
-output_file_name = f"{datetime.now().strftime('%Y-%m-%d_%H-%M-%S')}.jsonl"
+async def awrite_logged_data(subl_logs_path, logged_data):
+    """Like write_logged_data, but never blocks the event loop"""
+    start = time.perf_counter_ns()
+    await get_log_writer().asubmit(subl_logs_path, logged_data, finalize=finalize_logged_data)
+    record_phase("enqueue", time.perf_counter_ns() - start)
 
 
-def write_logged_data(subl_logs_path, logged_data, file_name):
-    with open(os.path.join(subl_logs_path, file_name), "a") as f:
-        f.write(json.dumps(logged_data, cls=GrammarEncoder) + "\n")
+def create_logged_data(
+    result, args, kwargs, caller_frame, grammar_json, duration_ms, capture_level=None
+):
+    """Create the logged data dictionary from a completion result, at the governor's capture_level"""
+    # Source lines are read on the writer thread, see finalize_logged_data
+    start = time.perf_counter_ns()
+    if capture_level is None or capture_level < NO_STACK:
+        stack = capture_stack(caller_frame)
+    else:
+        stack = []
+    stack_done = time.perf_counter_ns()
+    record_phase("stack", stack_done - start)
 
-
-def create_logged_data(result, args, kwargs, caller_frame, grammar_json, duration_ms):
-    """Create the logged data dictionary from a completion result"""
-    # Get the full stack trace
-    stack = inspect.stack()
-    stack_info = []
-
-    project_root = os.getcwd()
-    excluded_patterns = [
-        '<frozen',  # Catches '<frozen runpy>' and similar
-        'site-packages',  # Excludes installed packages
-        'dist-packages',  # Excludes system packages on some Linux systems
-        'lib/python',     # Excludes Python standard library
-    ]
-
-    for frame_info in reversed(stack):
-        filename = frame_info.filename
-        abs_filename = os.path.abspath(filename)
-
-        # Skip frames matching excluded patterns
-        if any(pattern in filename for pattern in excluded_patterns):
-            continue
-
-        # Skip frames outside project directory
-        if not abs_filename.startswith(project_root):
-            continue
-
-        code_context = frame_info.code_context if frame_info.code_context else []
-        stack_info.append(
-            {
-                "filename": frame_info.filename,
-                "lineno": frame_info.lineno,
-                "code_context": code_context,
-                "function": frame_info.function,
-            }
-        )
-
-    # Process messages to handle base64 images
-    messages = kwargs.get("messages", [])
+    # Copy the messages since the record is serialized later on the writer
+    # thread; base64 payloads are redacted there too, see finalize_logged_data
     processed_messages = []
-    for msg in messages:
+    for msg in kwargs.get("messages", []):
         if isinstance(msg, dict):
-            processed_msg = msg.copy()
-            content = msg.get("content")
-
-            # Handle list-type content (multimodal messages)
-            if isinstance(content, list):
-                processed_content = []
-                for item in content:
-                    if isinstance(item, dict):
-                        item_copy = item.copy()
-                        if "image_url" in item_copy:
-                            url = item_copy["image_url"].get("url", "")
-                            if url and url.startswith("data:image"):
-                                item_copy["image_url"]["url"] = "[BASE64_IMAGE_REMOVED]"
-                        processed_content.append(item_copy)
-                    else:
-                        processed_content.append(item)
-                processed_msg["content"] = processed_content
-
-            processed_messages.append(processed_msg)
+            processed_messages.append(snapshot(msg))
         else:
             # Handle non-dict message objects (like ChatCompletionMessage)
             processed_messages.append({
@@ -107,36 +69,21 @@ def create_logged_data(result, args, kwargs, caller_frame, grammar_json, duratio
                 **({"name": msg.name} if getattr(msg, "name", None) else {})
             })
 
-    # Process response to handle base64 images
-    response_dict = result.to_dict()
-    for choice in response_dict.get("choices", []):
-        message = choice.get("message", {})
-        content = message.get("content")
-
-        if isinstance(content, list):
-            processed_content = []
-            for item in content:
-                if isinstance(item, dict):
-                    item_copy = item.copy()
-                    if "image_url" in item_copy:
-                        url = item_copy["image_url"].get("url", "")
-                        if url and url.startswith("data:image"):
-                            item_copy["image_url"]["url"] = "[BASE64_IMAGE_REMOVED]"
-                    processed_content.append(item_copy)
-                else:
-                    processed_content.append(item)
-            message["content"] = processed_content
-    return {
+    logged_data = {
         "log_id": str(uuid.uuid4()),
         "session_id": request_id_ctx_var.get(),
         "messages": processed_messages,
-        "grammar_result": grammar_json,
+        # A DeferredGrammar takes its own snapshot of the caller's locals
+        "grammar_result": grammar_json
+        if isinstance(grammar_json, DeferredGrammar)
+        else snapshot(grammar_json),
         "symbolic_mappings": [],  # Simplified for now
-        "response": response_dict,
-        "usage": result.usage.to_dict(),
+        # SDK objects are converted on the writer thread, see finalize_logged_data
+        "response": result,
+        "usage": result.usage,
         "timestamp": int(time.time()),
         "duration_ms": duration_ms,
-        "stack_trace": stack_info,
+        "stack_trace": stack,
         "call_parameters": {
             "model": kwargs.get("model"),
             "temperature": kwargs.get("temperature"),
@@ -151,11 +98,51 @@ def create_logged_data(result, args, kwargs, caller_frame, grammar_json, duratio
             **kwargs.get("extra_headers", {}),
         },
     }
+    if capture_level is not None:
+        logged_data["capture_level"] = CAPTURE_LEVELS[capture_level]
+    record_phase("record", time.perf_counter_ns() - stack_done)
+    return logged_data
+
+
+def resolve_grammar(grammar_json):
+    """Work out a grammar captured with SUBL_DEFER_GRAMMAR"""
+    if not isinstance(grammar_json, DeferredGrammar):
+        return grammar_json
+    try:
+        return grammar_json.resolve()
+    except Exception as e:
+        logger.error("\033[92m\033[94m[sublingual]\033[0m Error processing grammar: %s", e)
+        return None
+
+
+def finalize_logged_data(logged_data):
+    """Runs on the writer thread before the record is serialized"""
+    logged_data = {
+        **logged_data,
+        "messages": redact_messages(logged_data["messages"]),
+        "grammar_result": resolve_grammar(logged_data["grammar_result"]),
+        "stack_trace": resolve_stack(logged_data["stack_trace"]),
+    }
+    result = logged_data["response"]
+    if not any(
+        isinstance(getattr(choice.message, "content", None), list)
+        for choice in getattr(result, "choices", None) or []
+    ):
+        # Nothing to redact, let the serializer encode the SDK object directly
+        return logged_data
+
+    response_dict = result.to_dict()
+    for choice in response_dict.get("choices", []):
+        message = choice.get("message", {})
+        if isinstance(message.get("content"), list):
+            message["content"] = redact_content(message["content"])
+    return {**logged_data, "response": response_dict}
 
 
-def setup_openai_logging(subl_logs_path: str):
-    """Set up synchronous logging for OpenAI completions"""
+def setup_openai_logging(subl_logs_path: str, sampler=None, governor=None):
+    """Set up synchronous logging for OpenAI completions, for the calls sampler and governor keep"""
     original_completions_create = chat.Completions.create
+    defer_grammar = os.getenv("SUBL_DEFER_GRAMMAR", "0") == "1"
 
     @functools.wraps(original_completions_create)
     def logged_completions_create(self, *args, **kwargs):
@@ -163,35 +150,59 @@ def setup_openai_logging(subl_logs_path: str):
         result = original_completions_create(self, *args, **kwargs)
         duration_ms = round((time.perf_counter() - start_time) * 1000)
 
+        caller_frame = inspect.currentframe().f_back
+        if sampler is not None and not sampler.keep(
+            caller_frame, request_id_ctx_var.get(), duration_ms
+        ):
+            return result
+        capture_level = None
+        if governor is not None:
+            capture_level = governor.admit()
+            if capture_level is None:
+                return result
+            capture_start = time.thread_time_ns()
+
+        grammar_start = time.perf_counter_ns()
         try:
-            caller_frame = inspect.currentframe().f_back
-            arg_node, env = get_arg_node(
-                caller_frame, original_completions_create.__name__
-            )
-            grammar_result = process_messages(
-                arg_node, env, f_locals=caller_frame.f_locals
-            )
-            grammar_dict = convert_grammar_to_dict(grammar_result)
+            if capture_level is not None and capture_level >= NO_GRAMMAR:
+                grammar_dict = None
+            elif defer_grammar:
+                # Worked out on the writer thread, see finalize_logged_data
+                grammar_dict = DeferredGrammar(
+                    caller_frame, original_completions_create.__name__, caller_frame.f_locals
+                )
+            else:
+                arg_node, env = get_arg_node(
+                    caller_frame, original_completions_create.__name__
+                )
+                grammar_result = process_messages(
+                    arg_node, env, f_locals=caller_frame.f_locals
+                )
+                grammar_dict = convert_grammar_to_dict(grammar_result)
         except Exception as e:
             logger.error("\033[92m\033[94m[sublingual]\033[0m Error processing grammar: %s", e)
             grammar_dict = None
+        record_phase("grammar", time.perf_counter_ns() - grammar_start)
 
         try:
             logged_data = create_logged_data(
-                result, args, kwargs, caller_frame, grammar_dict, duration_ms
+                result, args, kwargs, caller_frame, grammar_dict, duration_ms, capture_level
             )
-            write_logged_data(subl_logs_path, logged_data, output_file_name)
+            write_logged_data(subl_logs_path, logged_data)
         except Exception as e:
             logger.error("\033[92m\033[94m[sublingual]\033[0m Error in logged_completions_create: %s", e)
         finally:
+            if governor is not None:
+                governor.record(time.thread_time_ns() - capture_start)
             return result
 
     chat.Completions.create = logged_completions_create
 
 
-def setup_openai_async_logging(subl_logs_path: str):
-    """Set up asynchronous logging for OpenAI completions"""
+def setup_openai_async_logging(subl_logs_path: str, sampler=None, governor=None):
+    """Set up asynchronous logging for OpenAI completions, for the calls sampler and governor keep"""
     original_acreate = chat.AsyncCompletions.create
+    defer_grammar = os.getenv("SUBL_DEFER_GRAMMAR", "0") == "1"
 
     @functools.wraps(original_acreate)
     async def logged_completions_acreate(self, *args, **kwargs):
@@ -199,20 +210,41 @@ def setup_openai_async_logging(subl_logs_path: str):
         result = await original_acreate(self, *args, **kwargs)
         duration_ms = round((time.perf_counter() - start_time) * 1000)
 
+        caller_frame = inspect.currentframe().f_back
+        if sampler is not None and not sampler.keep(
+            caller_frame, request_id_ctx_var.get(), duration_ms
+        ):
+            return result
+        capture_level = None
+        if governor is not None:
+            capture_level = governor.admit()
+            if capture_level is None:
+                return result
+            capture_start = time.thread_time_ns()
+
+        grammar_start = time.perf_counter_ns()
         try:
-            arg_node, env = get_arg_node(inspect.currentframe().f_back, "create")
-            grammar_result = process_messages(arg_node, env)
-            grammar_dict = convert_grammar_to_dict(grammar_result)
+            if capture_level is not None and capture_level >= NO_GRAMMAR:
+                grammar_dict = None
+            elif defer_grammar:
+                grammar_dict = DeferredGrammar(caller_frame, "create")
+            else:
+                arg_node, env = get_arg_node(caller_frame, "create")
+                grammar_result = process_messages(arg_node, env)
+                grammar_dict = convert_grammar_to_dict(grammar_result)
         except Exception as e:
             logger.error("\033[92m\033[94m[sublingual]\033[0m Error processing grammar: %s", e)
             grammar_dict = None
+        record_phase("grammar", time.perf_counter_ns() - grammar_start)
 
         try:
-            caller_frame = inspect.currentframe().f_back
             logged_data = create_logged_data(
-                result, args, kwargs, caller_frame, grammar_dict, duration_ms
+                result, args, kwargs, caller_frame, grammar_dict, duration_ms, capture_level
             )
-            write_logged_data(subl_logs_path, logged_data, output_file_name)
+            if governor is not None:
+                # Before awaiting, while the thread's CPU time is all ours
+                governor.record(time.thread_time_ns() - capture_start)
+            await awrite_logged_data(subl_logs_path, logged_data)
         except Exception as e:
             logger.error("\033[92m\033[94m[sublingual]\033[0m Error in logged_completions_acreate: %s", e)
         finally:
@@ -0,0 +1,88 @@
+import bisect
+import os
+import threading
+
+# Capture phases, in the order a call goes through them; all but the last
+# three run on the calling thread
+PHASES = ("grammar", "stack", "record", "enqueue", "finalize", "serialize", "write")
+
+# Upper bounds of the histogram buckets, in microseconds; a last bucket
+# holds everything slower
+BUCKET_BOUNDS_US = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, 10000, 50000, 100000)
+_BUCKET_BOUNDS_NS = tuple(bound * 1000 for bound in BUCKET_BOUNDS_US)
+
+
+class Histogram:
+    """Counts durations in fixed buckets, so it stays small however many it sees"""
+
+    def __init__(self):
+        self.count = 0
+        self.total_ns = 0
+        self.max_ns = 0
+        self.buckets = [0] * (len(_BUCKET_BOUNDS_NS) + 1)
+
+    def add(self, ns):
+        self.count += 1
+        self.total_ns += ns
+        if ns > self.max_ns:
+            self.max_ns = ns
+        self.buckets[bisect.bisect_left(_BUCKET_BOUNDS_NS, ns)] += 1
+
+    def percentile_us(self, fraction):
+        """Upper bound of the bucket holding the given fraction of durations"""
+        rank = fraction * self.count
+        seen = 0
+        for i, n in enumerate(self.buckets):
+            seen += n
+            if n and seen >= rank:
+                break
+        return BUCKET_BOUNDS_US[i] if i < len(BUCKET_BOUNDS_US) else round(self.max_ns / 1000, 1)
+
+    def summary(self):
+        return {
+            "count": self.count,
+            "mean_us": round(self.total_ns / self.count / 1000, 1) if self.count else 0,
+            "p50_us": self.percentile_us(0.5),
+            "p90_us": self.percentile_us(0.9),
+            "p99_us": self.percentile_us(0.99),
+            "max_us": round(self.max_ns / 1000, 1),
+        }
+
+
+_histograms = {phase: Histogram() for phase in PHASES}
+_lock = threading.Lock()
+
+
+def record_phase(phase, ns):
+    """Add how long one call spent in phase, measured with perf_counter_ns"""
+    with _lock:
+        _histograms[phase].add(ns)
+
+
+def phase_stats():
+    """Summaries of the time spent in each phase that has run so far"""
+    with _lock:
+        return {
+            phase: histogram.summary()
+            for phase, histogram in _histograms.items()
+            if histogram.count
+        }
+
+
+def reset_phase_stats():
+    """Start the histograms over"""
+    with _lock:
+        for phase in PHASES:
+            _histograms[phase] = Histogram()
+
+
+def _after_fork_in_child():
+    # The child counts only its own calls, and the lock may have been held
+    # by a thread that doesn't exist in the child
+    global _lock
+    _lock = threading.Lock()
+    reset_phase_stats()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_after_fork_in_child)
@@ -0,0 +1,125 @@
+import hashlib
+import json
+from sublingual_eval.logging.blob_store import BLOB_REF_KEY
+from sublingual_eval.logging.serialization import SDK_DUMP_KWARGS, to_jsonable
+
+TRUNCATED_KEY = "$truncated"
+
+# What happens to a field over its limit:
+#   truncate - keep the first limit bytes, with the full length and sha256
+#   blob     - move the whole value to the blob store and keep a reference
+OVERSIZE_MODES = ("truncate", "blob")
+
+
+def _utf8_size(text, limit):
+    """Return the UTF-8 size of text, or 0 if it is certainly within limit"""
+    # Each character is 1 to 4 bytes, which often settles it without encoding
+    if len(text) * 4 <= limit:
+        return 0
+    return len(text.encode("utf-8"))
+
+
+class PayloadLimiter:
+    """Bounds the size of every string in a record.
+
+    Strings longer than max_field_bytes, and InferredVar values (the raw
+    local variables a prompt was built from) longer than max_var_bytes once
+    encoded, are truncated or moved to the blob store depending on mode.
+    Truncated values become {"$truncated": {"bytes": ..., "sha256": ...},
+    "text": <first bytes>}. InferredVar values that JSON can't encode are
+    logged as their str(). A limit of 0 disables it.
+
+    SDK response models, such as an OpenAI ChatCompletion, whose JSON is
+    over max_field_bytes are converted to the dicts the serializer would
+    write so their contents are capped too. Smaller ones, which can't hold
+    an oversized string, are left to the serializer like other objects. Changed containers are copied
+    and the input is never modified.
+    """
+
+    def __init__(self, max_field_bytes=0, max_var_bytes=0, mode="truncate"):
+        if mode not in OVERSIZE_MODES:
+            raise ValueError(
+                f"oversize mode must be one of {', '.join(OVERSIZE_MODES)}, got {mode!r}"
+            )
+        self.max_field_bytes = max_field_bytes
+        self.max_var_bytes = max_var_bytes
+        self.mode = mode
+
+    def limit(self, record, store=None):
+        """Return record with oversized values replaced; in blob mode they go to store, if given"""
+        return self._walk(record, store)
+
+    def _walk(self, obj, store):
+        if isinstance(obj, str):
+            return self._cap(obj, self.max_field_bytes, store)
+        if isinstance(obj, dict):
+            is_var = obj.get("type") == "InferredVar"
+            changed = False
+            result = {}
+            for k, v in obj.items():
+                if is_var and k == "value":
+                    new_v = self._cap_var(v, store)
+                else:
+                    new_v = self._walk(v, store)
+                changed = changed or new_v is not v
+                result[k] = new_v
+            return result if changed else obj
+        if isinstance(obj, list):
+            result = [self._walk(v, store) for v in obj]
+            if any(new is not old for new, old in zip(result, obj)):
+                return result
+            return obj
+        if hasattr(obj, "model_dump") and self._may_exceed(obj):
+            return self._walk(to_jsonable(obj), store)
+        return obj
+
+    def _may_exceed(self, model):
+        """Whether any string in an SDK model could be over max_field_bytes"""
+        if not self.max_field_bytes:
+            return False
+        if not hasattr(model, "model_dump_json"):
+            return True
+        text = model.model_dump_json(**SDK_DUMP_KWARGS)
+        return _utf8_size(text, self.max_field_bytes) > self.max_field_bytes
+
+    def _cap_var(self, value, store):
+        if isinstance(value, str):
+            return self._cap(value, self.max_var_bytes, store)
+        if value is None or isinstance(value, (bool, int, float)):
+            return value
+        try:
+            text = json.dumps(value, default=to_jsonable)
+        except (TypeError, ValueError):
+            # Log what InferredVar.get_value would show
+            value = text = str(value)
+        capped = self._cap(text, self.max_var_bytes, store)
+        return value if capped is text else capped
+
+    def _cap(self, text, limit, store):
+        if not limit:
+            return text
+        size = _utf8_size(text, limit)
+        if size <= limit:
+            return text
+        data = text.encode("utf-8")
+        if self.mode == "blob" and store is not None:
+            return {BLOB_REF_KEY: store.put(data), "bytes": size}
+        return {
+            TRUNCATED_KEY: {"bytes": size, "sha256": hashlib.sha256(data).hexdigest()},
+            "text": data[:limit].decode("utf-8", errors="ignore"),
+        }
+
+
+def describe_truncated(obj):
+    """Replace every truncation marker in a decoded record with its text and a note"""
+    if isinstance(obj, dict):
+        if TRUNCATED_KEY in obj:
+            info = obj[TRUNCATED_KEY]
+            return (
+                f"{obj.get('text', '')}… [truncated, {info['bytes']} bytes, "
+                f"sha256 {info['sha256'][:16]}]"
+            )
+        return {k: describe_truncated(v) for k, v in obj.items()}
+    if isinstance(obj, list):
+        return [describe_truncated(v) for v in obj]
+    return obj
@@ -0,0 +1,58 @@
+import json
+import os
+from sublingual_eval.logging.blob_store import BlobStore, blobs_dir, resolve_blob_refs
+from sublingual_eval.logging.interning import (
+    GRAMMARS_TABLE,
+    STACKS_TABLE,
+    interned_dir,
+    join_grammar,
+    load_intern_table,
+    replace_key,
+)
+from sublingual_eval.logging.payload_limits import describe_truncated
+
+
+class RecordDecoder:
+    """Parses logged JSON lines back into the records the capture layer produced.
+
+    Message contents kept in the blob store are resolved back to their text,
+    values cut by the payload limits are shown as their prefix with a note,
+    and interned stack traces and grammars are looked up in the side tables
+    next to logs_dir, which are loaded the first time they are needed.
+    """
+
+    def __init__(self, logs_dir):
+        self.logs_dir = logs_dir
+        self._blob_store = BlobStore(blobs_dir(logs_dir))
+        self._stack_traces = None
+        self._grammars = None
+
+    def decode(self, line):
+        """Return the record on a line, or None if it isn't an LLM call (e.g. capture_stats).
+
+        Raises ValueError if the line isn't a JSON object, e.g. a torn tail.
+        """
+        obj = json.loads(line)
+        if not isinstance(obj, dict):
+            raise ValueError("not a JSON object")
+        if "record_type" in obj:
+            return None
+        if b'"$blob"' in line:
+            obj = resolve_blob_refs(obj, self._blob_store)
+        if b'"$truncated"' in line:
+            obj = describe_truncated(obj)
+        if "stack_id" in obj:
+            if self._stack_traces is None:
+                self._stack_traces = self._load_table(STACKS_TABLE)
+            stack_trace = self._stack_traces.get(obj["stack_id"], [])
+            obj = replace_key(obj, "stack_id", "stack_trace", stack_trace)
+        if "grammar_id" in obj:
+            if self._grammars is None:
+                self._grammars = self._load_table(GRAMMARS_TABLE)
+            skeleton = self._grammars.get(obj["grammar_id"])
+            grammar = join_grammar(skeleton, obj.pop("grammar_values", []))
+            obj = replace_key(obj, "grammar_id", "grammar_result", grammar)
+        return obj
+
+    def _load_table(self, name):
+        return load_intern_table(os.path.join(interned_dir(self.logs_dir), name))
@@ -0,0 +1,116 @@
+import base64
+import binascii
+import hashlib
+
+# What replaces removed binary data; the size and hash go next to it
+REMOVED_PLACEHOLDER = "[BASE64_IMAGE_REMOVED]"
+REDACTED_KEY = "redacted"
+
+
+def describe_binary(data, media_type=None):
+    """Size and sha256 of base64 data, which are logged in its place"""
+    try:
+        raw = base64.b64decode(data)
+    except (binascii.Error, ValueError):
+        # Not valid base64, describe the text as sent
+        raw = data.encode("utf-8")
+    info = {"bytes": len(raw), "sha256": hashlib.sha256(raw).hexdigest()}
+    if media_type:
+        info["media_type"] = media_type
+    return info
+
+
+def redact_image_url(part):
+    """OpenAI image parts with a data: URL, e.g. {"image_url": {"url": "data:image/png;base64,..."}}"""
+    image_url = part.get("image_url")
+    if not isinstance(image_url, dict):
+        return part
+    url = image_url.get("url")
+    if not isinstance(url, str) or not url.startswith("data:"):
+        return part
+    header, _, data = url.partition(",")
+    media_type = header[len("data:"):].split(";")[0]
+    return {
+        **part,
+        "image_url": {
+            **image_url,
+            "url": REMOVED_PLACEHOLDER,
+            REDACTED_KEY: describe_binary(data, media_type),
+        },
+    }
+
+
+def redact_input_audio(part):
+    """OpenAI audio parts, {"input_audio": {"data": ..., "format": "wav"}}"""
+    audio = part.get("input_audio")
+    if not isinstance(audio, dict) or not isinstance(audio.get("data"), str):
+        return part
+    media_type = f"audio/{audio['format']}" if audio.get("format") else None
+    redacted = {k: v for k, v in audio.items() if k != "data"}
+    redacted[REDACTED_KEY] = describe_binary(audio["data"], media_type)
+    return {**part, "input_audio": redacted}
+
+
+def redact_base64_source(part):
+    """Anthropic image and document blocks, {"source": {"type": "base64", "data": ...}}"""
+    source = part.get("source")
+    if (
+        not isinstance(source, dict)
+        or source.get("type") != "base64"
+        or not isinstance(source.get("data"), str)
+    ):
+        return part
+    redacted = {k: v for k, v in source.items() if k != "data"}
+    redacted[REDACTED_KEY] = describe_binary(source["data"], source.get("media_type"))
+    return {**part, "source": redacted}
+
+
+# Each takes a content part and returns it unchanged, or a redacted copy
+_redactors = [redact_image_url, redact_input_audio, redact_base64_source]
+
+
+def add_redactor(redactor):
+    """Also apply redactor to every content part, e.g. to mask other payloads"""
+    _redactors.append(redactor)
+
+
+def _redact_part(part):
+    if not isinstance(part, dict):
+        return part
+    for redactor in _redactors:
+        part = redactor(part)
+    # Anthropic tool results nest their own content blocks
+    content = part.get("content")
+    if isinstance(content, list):
+        new_content = redact_content(content)
+        if new_content is not content:
+            part = {**part, "content": new_content}
+    return part
+
+
+def redact_content(content):
+    """Return a list of content parts with binary data replaced by its size and hash.
+
+    Only the parts and dicts that change are copied; everything else is
+    shared with the input, which is never modified. An input without any
+    binary data is returned as is.
+    """
+    result = [_redact_part(part) for part in content]
+    if any(new is not old for new, old in zip(result, content)):
+        return result
+    return content
+
+
+def redact_messages(messages):
+    """Apply redact_content to the content of every message"""
+    result = []
+    for msg in messages:
+        content = msg.get("content") if isinstance(msg, dict) else None
+        if isinstance(content, list):
+            new_content = redact_content(content)
+            if new_content is not content:
+                msg = {**msg, "content": new_content}
+        result.append(msg)
+    if any(new is not old for new, old in zip(result, messages)):
+        return result
+    return messages
@@ -0,0 +1,141 @@
+import logging
+import os
+import random
+import zlib
+
+# Set up logging
+logger = logging.getLogger("sublingual")
+
+# Most call sites whose rate is remembered before the cache is emptied
+CALL_SITE_CACHE_SIZE = 4096
+
+
+class Sampler:
+    """Decides which LLM calls are captured, after each call returns.
+
+    Each call is kept with probability rate, or with the rate of the first
+    entry in call_site_rates matching where it was called from. Entries are
+    keyed by a path suffix with an optional line, e.g. "app/chat.py" or
+    "app/chat.py:42". With by_session, the decision is made once per
+    session_id by hashing it, so a session is kept or dropped whole in every
+    process. Calls that took at least keep_slow_ms milliseconds are always
+    kept.
+
+    Calls that are not kept skip stack capture, grammar and serialization.
+    """
+
+    def __init__(self, rate=1.0, by_session=False, call_site_rates=None, keep_slow_ms=0):
+        self.rate = rate
+        self.by_session = by_session
+        self.call_site_rates = dict(call_site_rates or {})
+        self.keep_slow_ms = keep_slow_ms
+        self.kept = 0
+        self.skipped = 0
+        self._site_rates = {}
+
+    def keep(self, frame, session_id=None, duration_ms=None):
+        """Return whether to capture the call made from frame"""
+        if self.keep_slow_ms and duration_ms is not None and duration_ms >= self.keep_slow_ms:
+            kept = True
+        else:
+            rate = self._rate_for(frame) if self.call_site_rates else self.rate
+            if rate >= 1:
+                kept = True
+            elif rate <= 0:
+                kept = False
+            elif self.by_session and session_id is not None:
+                kept = zlib.crc32(str(session_id).encode("utf-8")) / 2**32 < rate
+            else:
+                kept = random.random() < rate
+        # Counted without a lock, so concurrent calls may lose a few
+        if kept:
+            self.kept += 1
+        else:
+            self.skipped += 1
+        return kept
+
+    def _rate_for(self, frame):
+        if frame is None:
+            return self.rate
+        key = (frame.f_code, frame.f_lineno)
+        rate = self._site_rates.get(key)
+        if rate is None:
+            rate = self._match_call_site(frame.f_code.co_filename, frame.f_lineno)
+            if len(self._site_rates) >= CALL_SITE_CACHE_SIZE:
+                self._site_rates.clear()
+            self._site_rates[key] = rate
+        return rate
+
+    def _match_call_site(self, filename, lineno):
+        filename = filename.replace(os.sep, "/")
+        for site, rate in self.call_site_rates.items():
+            path, _, line = site.rpartition(":")
+            if not line.isdigit():
+                path, line = site, None
+            elif int(line) != lineno:
+                continue
+            if filename == path or filename.endswith("/" + path.lstrip("/")):
+                return rate
+        return self.rate
+
+    def stats(self):
+        return {"kept": self.kept, "skipped": self.skipped}
+
+
+def _parse_rate(value):
+    """Return value as a rate from 0 to 1, or None if it isn't one"""
+    try:
+        rate = float(value)
+    except ValueError:
+        return None
+    return rate if 0 <= rate <= 1 else None
+
+
+def parse_call_site_rates(value):
+    """Parse "app/chat.py:42=0.1,app/jobs.py=0" into {"app/chat.py:42": 0.1, "app/jobs.py": 0.0}"""
+    rates = {}
+    for entry in value.split(","):
+        entry = entry.strip()
+        if not entry:
+            continue
+        site, _, rate = entry.rpartition("=")
+        rate = _parse_rate(rate)
+        if not site.strip() or rate is None:
+            logger.warning(
+                "\033[93m[sublingual] Warning:\033[0m Ignoring SUBL_SAMPLE_CALL_SITES entry %r, expected path[:line]=rate",
+                entry,
+            )
+            continue
+        rates[site.strip()] = rate
+    return rates
+
+
+# The Sampler init() built, for sublingual_eval.stats()
+_sampler = None
+
+
+def sampler_from_env():
+    """Build the Sampler configured by the SUBL_SAMPLE_* variables, or None to capture every call"""
+    global _sampler
+    rate = _parse_rate(os.getenv("SUBL_SAMPLE_RATE", "1"))
+    if rate is None:
+        logger.warning(
+            "\033[93m[sublingual] Warning:\033[0m Ignoring SUBL_SAMPLE_RATE %r, expected a rate from 0 to 1",
+            os.getenv("SUBL_SAMPLE_RATE"),
+        )
+        rate = 1.0
+    call_site_rates = parse_call_site_rates(os.getenv("SUBL_SAMPLE_CALL_SITES", ""))
+    try:
+        keep_slow_ms = int(os.getenv("SUBL_SAMPLE_KEEP_SLOW_MS", "0"))
+    except ValueError:
+        keep_slow_ms = 0
+    if rate >= 1 and not call_site_rates:
+        _sampler = None
+    else:
+        _sampler = Sampler(
+            rate=rate,
+            by_session=os.getenv("SUBL_SAMPLE_BY_SESSION", "0") == "1",
+            call_site_rates=call_site_rates,
+            keep_slow_ms=keep_slow_ms,
+        )
+    return _sampler
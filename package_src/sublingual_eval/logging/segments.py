@@ -0,0 +1,277 @@
+import json
+import os
+import time
+from datetime import datetime
+from sublingual_eval.logging.compression import CODECS, codec_for_path, get_codec
+
+MANIFEST_FILE_NAME = "manifest.jsonl"
+INDEX_EXTENSION = ".idx"
+SEGMENT_EXTENSIONS = (".jsonl",) + tuple(".jsonl" + c.extension for c in CODECS.values())
+
+
+def manifest_path(logs_dir):
+    """The manifest lives next to the logs directory so it is never listed as a log"""
+    return os.path.join(os.path.dirname(os.path.abspath(logs_dir)), MANIFEST_FILE_NAME)
+
+
+def new_segment_path(logs_dir, extension=".jsonl"):
+    """Return an unused path for a new segment, e.g. 2025-01-31_12-00-00_4242.jsonl
+
+    Segments are keyed by start time and pid so that server workers started
+    in the same second never append to the same file. A counter is added when
+    a process rotates more than once within the same second.
+    """
+    started = datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
+    base = f"{started}_{os.getpid()}"
+    path = os.path.join(logs_dir, base + extension)
+    n = 1
+    while os.path.exists(path):
+        path = os.path.join(logs_dir, f"{base}_{n}{extension}")
+        n += 1
+    return path
+
+
+class Segment:
+    """An open log segment and the running totals recorded in the manifest"""
+
+    extension = ".jsonl"
+
+    def __init__(self, logs_dir):
+        self.logs_dir = logs_dir
+        self.path = new_segment_path(logs_dir, self.extension)
+        self.file = open(self.path, "ab")
+        self.opened_at = time.time()
+        self.records = 0
+        self.bytes = 0
+        self.start_ts = None
+        self.end_ts = None
+
+    def write(self, lines, timestamps):
+        """Append serialized lines with a single write"""
+        timestamps = [ts for ts in timestamps if ts is not None]
+        self.bytes += self._write_data(b"".join(lines), len(lines), timestamps)
+        self.records += len(lines)
+        if timestamps:
+            if self.start_ts is None or min(timestamps) < self.start_ts:
+                self.start_ts = min(timestamps)
+            if self.end_ts is None or max(timestamps) > self.end_ts:
+                self.end_ts = max(timestamps)
+
+    def _write_data(self, data, records, timestamps):
+        self.file.write(data)
+        return len(data)
+
+    def flush(self, fsync=False):
+        self.file.flush()
+        if fsync:
+            os.fsync(self.file.fileno())
+
+    def is_full(self, max_bytes, max_age_s):
+        if max_bytes and self.bytes >= max_bytes:
+            return True
+        if max_age_s and time.time() - self.opened_at >= max_age_s:
+            return True
+        return False
+
+    def manifest_entry(self):
+        return {
+            "segment": os.path.basename(self.path),
+            "codec": None,
+            "pid": os.getpid(),
+            "start_ts": self.start_ts,
+            "end_ts": self.end_ts,
+            "records": self.records,
+            "bytes": self.bytes,
+            "opened_at": round(self.opened_at, 3),
+            "closed_at": round(time.time(), 3),
+        }
+
+    def close(self):
+        """Close the segment and record it in the manifest"""
+        self.file.close()
+        if not self.records:
+            # Nothing was ever written here, don't leave an empty segment behind
+            self._remove()
+            return
+        # A single short line per segment, appended with O_APPEND so entries
+        # from concurrent processes don't interleave
+        line = json.dumps(self.manifest_entry()) + "\n"
+        with open(manifest_path(self.logs_dir), "a") as f:
+            f.write(line)
+
+    def abandon(self):
+        """Close the file without recording the segment, e.g. in a forked child
+
+        The parent process still owns the segment and will close it; the
+        file buffers must already be flushed, or their contents would be
+        written twice.
+        """
+        self.file.close()
+
+    def _remove(self):
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
+
+
+class CompressedSegment(Segment):
+    """A segment made of independently compressed blocks, one per group commit.
+
+    Next to the segment, <segment>.idx holds one JSON line per block with its
+    offset, compressed length, record count and time range, so readers can
+    seek straight to the blocks they need.
+    """
+
+    def __init__(self, logs_dir, codec):
+        self.codec = codec
+        self.extension = ".jsonl" + codec.extension
+        super().__init__(logs_dir)
+        self.index_file = open(self.path + INDEX_EXTENSION, "ab")
+
+    def _write_data(self, data, records, timestamps):
+        block = self.codec.compress(data)
+        offset = self.bytes
+        self.file.write(block)
+        # The block must reach the file before the index entry that points at it
+        self.file.flush()
+        entry = {
+            "offset": offset,
+            "length": len(block),
+            "records": records,
+            "raw_bytes": len(data),
+            "start_ts": min(timestamps) if timestamps else None,
+            "end_ts": max(timestamps) if timestamps else None,
+        }
+        self.index_file.write(json.dumps(entry).encode("utf-8") + b"\n")
+        return len(block)
+
+    def flush(self, fsync=False):
+        super().flush(fsync)
+        self.index_file.flush()
+        if fsync:
+            os.fsync(self.index_file.fileno())
+
+    def manifest_entry(self):
+        entry = super().manifest_entry()
+        entry["codec"] = self.codec.name
+        return entry
+
+    def close(self):
+        self.index_file.close()
+        super().close()
+
+    def abandon(self):
+        self.index_file.close()
+        super().abandon()
+
+    def _remove(self):
+        super()._remove()
+        try:
+            os.remove(self.path + INDEX_EXTENSION)
+        except OSError:
+            pass
+
+
+def open_segment(logs_dir, compression=None):
+    """Start a new segment in logs_dir, compressed with the named codec if given"""
+    if compression:
+        return CompressedSegment(logs_dir, get_codec(compression))
+    return Segment(logs_dir)
+
+
+def read_block_index(path):
+    """Return the block index of a compressed segment, or None if it has none"""
+    try:
+        with open(path + INDEX_EXTENSION, "rb") as f:
+            entries = []
+            for line in f:
+                try:
+                    entries.append(json.loads(line))
+                except ValueError:
+                    # A torn final entry; its block is picked up as trailing data
+                    break
+            return entries
+    except FileNotFoundError:
+        return None
+
+
+def iter_segment_lines(path, start=None, end=None):
+    """Yield the raw JSON lines stored in a segment.
+
+    For compressed segments only the blocks whose time range overlaps
+    [start, end] are read and decompressed; plain segments are read in full.
+    Callers still need to filter individual records by timestamp.
+    """
+    codec = codec_for_path(path)
+    if codec is None:
+        with open(path, "rb") as f:
+            yield from f
+        return
+
+    index = read_block_index(path)
+    with open(path, "rb") as f:
+        if index is None:
+            yield from codec.decompress(f.read()).splitlines(keepends=True)
+            return
+        indexed_end = 0
+        for block in index:
+            indexed_end = block["offset"] + block["length"]
+            if block["start_ts"] is not None:
+                if start is not None and block["end_ts"] < start:
+                    continue
+                if end is not None and block["start_ts"] > end:
+                    continue
+            f.seek(block["offset"])
+            data = f.read(block["length"])
+            if len(data) < block["length"]:
+                return
+            yield from codec.decompress(data).splitlines(keepends=True)
+        # Blocks written just before a crash may be missing from the index
+        f.seek(indexed_end)
+        trailing = f.read()
+        if trailing:
+            try:
+                yield from codec.decompress(trailing).splitlines(keepends=True)
+            except Exception:
+                pass
+
+
+def read_manifest(logs_dir):
+    """Return the manifest entries for closed segments, keyed by segment file name"""
+    entries = {}
+    try:
+        with open(manifest_path(logs_dir)) as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue
+                entries[entry["segment"]] = entry
+    except FileNotFoundError:
+        pass
+    return entries
+
+
+def segments_in_range(logs_dir, start=None, end=None, extensions=SEGMENT_EXTENSIONS):
+    """Return the segments in logs_dir that may hold records between start and end.
+
+    Closed segments are skipped using their manifest time range. Segments that
+    are not in the manifest (still being written, or from a crashed process)
+    are always included.
+    """
+    if not os.path.isdir(logs_dir):
+        return []
+    manifest = read_manifest(logs_dir)
+    paths = []
+    for name in sorted(os.listdir(logs_dir)):
+        if not name.endswith(extensions):
+            continue
+        entry = manifest.get(name)
+        if entry is not None and entry["start_ts"] is not None:
+            if start is not None and entry["end_ts"] < start:
+                continue
+            if end is not None and entry["start_ts"] > end:
+                continue
+        paths.append(os.path.join(logs_dir, name))
+    return paths
@@ -0,0 +1,137 @@
+import copy
+import json
+import logging
+import os
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgspec
+except ImportError:
+    msgspec = None
+
+# Set up logging
+logger = logging.getLogger("sublingual")
+
+
+# Same shape as the SDKs' to_dict(): only the fields the API actually returned
+SDK_DUMP_KWARGS = {"exclude_unset": True, "by_alias": True}
+
+
+def to_jsonable(obj):
+    """Convert objects JSON can't encode natively, such as SDK response models"""
+    if hasattr(obj, "__json__"):
+        return obj.__json__()
+    if hasattr(obj, "model_dump"):
+        return obj.model_dump(mode="json", **SDK_DUMP_KWARGS)
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+def snapshot(value):
+    """Copy a caller's value so changes the caller makes after the call don't reach the record.
+
+    Records are serialized later, on the log writer thread. Values that can't
+    be copied are logged as their str().
+    """
+    if value is None or isinstance(value, (str, bytes, int, float, bool)):
+        return value
+    # Walked here so one value that can't be copied doesn't stringify the rest
+    if isinstance(value, dict):
+        return {key: snapshot(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [snapshot(item) for item in value]
+    try:
+        return copy.deepcopy(value)
+    except Exception:
+        return str(value)
+
+
+class GrammarEncoder(json.JSONEncoder):
+    def default(self, obj):
+        try:
+            return to_jsonable(obj)
+        except TypeError:
+            return super().default(obj)
+
+
+class Serializer:
+    """Turns a record into one line of JSON bytes (without the newline)"""
+
+    name = "json"
+
+    def dumps(self, record):
+        return json.dumps(record, cls=GrammarEncoder).encode("utf-8")
+
+
+class OrjsonSerializer(Serializer):
+    name = "orjson"
+
+    def __init__(self):
+        self._fragment = getattr(orjson, "Fragment", None)
+
+    def _default(self, obj):
+        if self._fragment is not None and hasattr(obj, "model_dump_json"):
+            # Splice in the SDK's own JSON bytes instead of building a dict
+            return self._fragment(obj.model_dump_json(**SDK_DUMP_KWARGS))
+        return to_jsonable(obj)
+
+    def dumps(self, record):
+        try:
+            return orjson.dumps(record, default=self._default, option=orjson.OPT_NON_STR_KEYS)
+        except TypeError:
+            # e.g. integers wider than 64 bits, which the stdlib handles
+            return super().dumps(record)
+
+
+class MsgspecSerializer(Serializer):
+    name = "msgspec"
+
+    def __init__(self):
+        self._encoder = msgspec.json.Encoder(enc_hook=self._enc_hook)
+
+    def _enc_hook(self, obj):
+        if hasattr(obj, "model_dump_json"):
+            # Splice in the SDK's own JSON bytes instead of building a dict
+            return msgspec.Raw(obj.model_dump_json(**SDK_DUMP_KWARGS))
+        return to_jsonable(obj)
+
+    def dumps(self, record):
+        try:
+            return self._encoder.encode(record)
+        except (TypeError, msgspec.EncodeError):
+            return super().dumps(record)
+
+
+SERIALIZERS = {
+    "orjson": (OrjsonSerializer, lambda: orjson is not None),
+    "msgspec": (MsgspecSerializer, lambda: msgspec is not None),
+    "json": (Serializer, lambda: True),
+}
+
+
+def get_serializer(name="auto"):
+    """Return the named serializer; "auto" picks the fastest one installed"""
+    if name == "auto":
+        for cls, available in SERIALIZERS.values():
+            if available():
+                return cls()
+    if name not in SERIALIZERS:
+        raise ValueError(
+            f"serializer must be auto or one of {', '.join(SERIALIZERS)}, got {name!r}"
+        )
+    cls, available = SERIALIZERS[name]
+    if not available():
+        raise ValueError(f"the {name} serializer requires the {name} package")
+    return cls()
+
+
+def serializer_from_env():
+    name = os.getenv("SUBL_SERIALIZER", "auto").lower()
+    try:
+        return get_serializer(name)
+    except ValueError as e:
+        logger.warning("\033[93m[sublingual] Warning:\033[0m %s, using auto", e)
+        return get_serializer("auto")
@@ -0,0 +1,126 @@
+import logging
+from sublingual_eval.logging.segments import open_segment
+
+# Set up logging
+logger = logging.getLogger("sublingual")
+
+
+class Sink:
+    """Somewhere the log writer stores records.
+
+    All methods are called from the writer thread, or with the writer
+    thread paused (before and after a fork). write gets a group of records
+    for one logs directory: the records themselves, finalized but before the
+    storage transforms (blob store, interning) are applied, and the
+    serialized JSON lines of the transformed records.
+    """
+
+    name = None
+
+    def write(self, logs_dir, records, lines):
+        raise NotImplementedError
+
+    def flush(self):
+        """Make everything written so far as durable as the sink is configured to"""
+
+    def close(self):
+        """Flush and release everything the sink holds"""
+
+    def before_fork(self):
+        """Leave nothing buffered in memory that a forked child could write again"""
+
+    def after_fork_in_child(self):
+        """Drop the parent's handles without writing anything through them"""
+
+
+class JsonlSink(Sink):
+    """Writes JSON lines to rotating per-process segments in the logs directory.
+
+    durability sets how hard each group is pushed towards the disk (see
+    DURABILITY_LEVELS in log_writer). A segment is rotated once it reaches
+    max_segment_bytes or is older than max_segment_age_s (0 disables either
+    limit). With a compression codec each group is written as one
+    compressed block.
+    """
+
+    name = "jsonl"
+
+    def __init__(
+        self,
+        durability="flush",
+        max_segment_bytes=64 * 1024 * 1024,
+        max_segment_age_s=0,
+        compression=None,
+    ):
+        self._durability = durability
+        self._max_segment_bytes = max_segment_bytes
+        self._max_segment_age_s = max_segment_age_s
+        self._compression = compression
+        self._segments = {}
+
+    def write(self, logs_dir, records, lines):
+        """Append lines to the logs_dir segment, rotating whenever it fills up"""
+        timestamps = [record.get("timestamp") for record in records]
+        start = 0
+        while start < len(lines):
+            segment = self._get_segment(logs_dir)
+            end = start
+            size = segment.bytes
+            while end < len(lines):
+                size += len(lines[end])
+                end += 1
+                if self._max_segment_bytes and size >= self._max_segment_bytes:
+                    break
+            segment.write(lines[start:end], timestamps[start:end])
+            if self._durability != "none":
+                segment.flush(fsync=self._durability == "fsync")
+            start = end
+
+    def _get_segment(self, logs_dir):
+        segment = self._segments.get(logs_dir)
+        if segment is not None and segment.is_full(
+            self._max_segment_bytes, self._max_segment_age_s
+        ):
+            self._close_segment(segment)
+            segment = None
+        if segment is None:
+            segment = open_segment(logs_dir, self._compression)
+            self._segments[logs_dir] = segment
+        return segment
+
+    def _close_segment(self, segment):
+        try:
+            segment.close()
+        except Exception as e:
+            logger.error(
+                "\033[92m\033[94m[sublingual]\033[0m Error closing log segment: %s", e
+            )
+
+    def flush(self):
+        for segment in self._segments.values():
+            try:
+                segment.flush(fsync=self._durability == "fsync")
+            except Exception as e:
+                logger.error(
+                    "\033[92m\033[94m[sublingual]\033[0m Error flushing log segment: %s", e
+                )
+
+    def close(self):
+        for segment in self._segments.values():
+            self._close_segment(segment)
+        self._segments.clear()
+
+    def before_fork(self):
+        for segment in self._segments.values():
+            try:
+                segment.flush()
+            except Exception:
+                pass
+
+    def after_fork_in_child(self):
+        for segment in self._segments.values():
+            try:
+                segment.abandon()
+            except Exception:
+                pass
+        self._segments = {}
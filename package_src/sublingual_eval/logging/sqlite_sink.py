@@ -0,0 +1,182 @@
+import os
+import sqlite3
+import zlib
+from sublingual_eval.logging.sinks import Sink
+
+DATABASE_FILE_NAME = "logs.db"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS records (
+    id INTEGER PRIMARY KEY,
+    log_id TEXT,
+    timestamp INTEGER,
+    session_id TEXT,
+    model TEXT,
+    call_site TEXT,
+    duration_ms REAL,
+    prompt_tokens INTEGER,
+    completion_tokens INTEGER,
+    total_tokens INTEGER,
+    pid INTEGER,
+    record BLOB NOT NULL
+);
+CREATE INDEX IF NOT EXISTS records_timestamp ON records (timestamp);
+CREATE INDEX IF NOT EXISTS records_session_id ON records (session_id, timestamp);
+CREATE INDEX IF NOT EXISTS records_model ON records (model, timestamp);
+CREATE INDEX IF NOT EXISTS records_call_site ON records (call_site, timestamp);
+CREATE INDEX IF NOT EXISTS records_duration_ms ON records (duration_ms);
+"""
+
+# PRAGMA synchronous for each durability level; in WAL mode NORMAL only
+# syncs at checkpoints, which matches handing the data to the OS
+SYNCHRONOUS = {"none": "OFF", "flush": "NORMAL", "fsync": "FULL"}
+
+COLUMNS = (
+    "log_id",
+    "timestamp",
+    "session_id",
+    "model",
+    "call_site",
+    "duration_ms",
+    "prompt_tokens",
+    "completion_tokens",
+    "total_tokens",
+    "pid",
+    "record",
+)
+
+
+def database_path(logs_dir):
+    """The database lives next to the logs directory, e.g. .sublingual/logs.db"""
+    return os.path.join(os.path.dirname(os.path.abspath(logs_dir)), DATABASE_FILE_NAME)
+
+
+def _get(obj, key):
+    """Read a field from a dict or an SDK object"""
+    if obj is None:
+        return None
+    if isinstance(obj, dict):
+        return obj.get(key)
+    return getattr(obj, key, None)
+
+
+def record_columns(record):
+    """Return the indexed column values for a logged LLM call"""
+    call_parameters = record.get("call_parameters") or {}
+    extra_info = record.get("extra_info") or {}
+    stack = record.get("stack_trace")
+    usage = record.get("usage")
+    return {
+        "log_id": record.get("log_id"),
+        "timestamp": record.get("timestamp"),
+        # Same fallback as the dashboard uses
+        "session_id": record.get("session_id") or extra_info.get("req_id"),
+        "model": _get(record.get("response"), "model") or call_parameters.get("model"),
+        "call_site": f"{stack[-1]['filename']}:{stack[-1]['lineno']}" if stack else None,
+        "duration_ms": record.get("duration_ms"),
+        "prompt_tokens": _get(usage, "prompt_tokens"),
+        "completion_tokens": _get(usage, "completion_tokens"),
+        "total_tokens": _get(usage, "total_tokens"),
+    }
+
+
+class SqliteSink(Sink):
+    """Inserts records into a SQLite database next to the logs directory.
+
+    The columns needed to filter calls (time, session, model, call site,
+    duration and token counts) are indexed, and the record itself is kept
+    as its zlib-compressed JSON line, so it reads back exactly like a line
+    from a JSONL segment. The database is in WAL mode so the dashboard can
+    read while processes write, and each group is one transaction.
+    """
+
+    name = "sqlite"
+
+    def __init__(self, durability="flush"):
+        self._synchronous = SYNCHRONOUS[durability]
+        self._connections = {}
+
+    def _connect(self, logs_dir):
+        conn = self._connections.get(logs_dir)
+        if conn is None:
+            # Used from the writer thread, and from the forking thread while
+            # the writer thread is paused
+            conn = sqlite3.connect(
+                database_path(logs_dir), timeout=10, check_same_thread=False
+            )
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(f"PRAGMA synchronous={self._synchronous}")
+            conn.executescript(SCHEMA)
+            self._connections[logs_dir] = conn
+        return conn
+
+    def write(self, logs_dir, records, lines):
+        rows = []
+        pid = os.getpid()
+        for record, line in zip(records, lines):
+            if "record_type" in record:
+                # Bookkeeping such as capture_stats only goes to the JSONL logs
+                continue
+            columns = record_columns(record)
+            rows.append(
+                tuple(columns[c] for c in COLUMNS[:-2]) + (pid, zlib.compress(line))
+            )
+        if not rows:
+            return
+        conn = self._connect(logs_dir)
+        with conn:
+            conn.executemany(
+                f"INSERT INTO records ({', '.join(COLUMNS)}) VALUES ({', '.join('?' * len(COLUMNS))})",
+                rows,
+            )
+
+    def close(self):
+        for conn in self._connections.values():
+            conn.close()
+        self._connections.clear()
+
+    def before_fork(self):
+        # SQLite connections must not be used across a fork, and closing one
+        # in the child could checkpoint the parent's WAL; close them here and
+        # let the parent reconnect on its next write
+        self.close()
+
+
+def query_records(
+    db_path,
+    start=None,
+    end=None,
+    model=None,
+    session_id=None,
+    call_site=None,
+    min_duration_ms=None,
+    limit=None,
+):
+    """Yield the JSON lines of the records matching every given filter, newest first"""
+    conditions = []
+    params = []
+    for column, op, value in (
+        ("timestamp", ">=", start),
+        ("timestamp", "<=", end),
+        ("model", "=", model),
+        ("session_id", "=", session_id),
+        ("call_site", "=", call_site),
+        ("duration_ms", ">=", min_duration_ms),
+    ):
+        if value is not None:
+            conditions.append(f"{column} {op} ?")
+            params.append(value)
+    sql = "SELECT record FROM records"
+    if conditions:
+        sql += " WHERE " + " AND ".join(conditions)
+    sql += " ORDER BY timestamp DESC, id DESC"
+    if limit is not None:
+        sql += " LIMIT ?"
+        params.append(limit)
+
+    conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+    try:
+        for (record,) in conn.execute(sql, params):
+            yield zlib.decompress(record)
+    finally:
+        conn.close()
@@ -0,0 +1,96 @@
+import linecache
+import os
+
+# Frames from these files are never part of the logged stack trace
+EXCLUDED_PATTERNS = (
+    "<frozen",  # Catches '<frozen runpy>' and similar
+    "site-packages",  # Excludes installed packages
+    "dist-packages",  # Excludes system packages on some Linux systems
+    "lib/python",  # Excludes Python standard library
+)
+
+# Most frames recorded per process before the cache is emptied
+FRAME_CACHE_SIZE = 4096
+
+# For the project root they were computed for: whether each filename is in
+# the project, and the captured form of each frame by (code object,
+# instruction offset), or None for frames outside the project
+_project_root = None
+_is_project_file = {}
+_frame_cache = {}
+_cache_hits = 0
+_cache_misses = 0
+
+
+def _in_project(filename, project_root):
+    if any(pattern in filename for pattern in EXCLUDED_PATTERNS):
+        return False
+    return os.path.abspath(filename).startswith(project_root)
+
+
+def _describe_frame(frame, project_root):
+    code = frame.f_code
+    filename = code.co_filename
+    in_project = _is_project_file.get(filename)
+    if in_project is None:
+        in_project = _is_project_file[filename] = _in_project(filename, project_root)
+    if not in_project:
+        return None
+    return (filename, frame.f_lineno, code.co_name)
+
+
+def capture_stack(frame):
+    """Return the project frames from the outermost one down to frame, e.g. the caller's.
+
+    A frame's filename, line and function never change for a given code
+    object and instruction offset, so each call site is looked up once and
+    then served from a bounded cache. resolve_stack adds the source lines
+    later, on the log writer thread.
+    """
+    global _project_root, _is_project_file, _frame_cache, _cache_hits, _cache_misses
+    project_root = os.getcwd()
+    if project_root != _project_root:
+        _project_root, _is_project_file, _frame_cache = project_root, {}, {}
+    cache = _frame_cache
+
+    frames = []
+    hits = 0
+    while frame is not None:
+        key = (frame.f_code, frame.f_lasti)
+        try:
+            info = cache[key]
+            hits += 1
+        except KeyError:
+            info = _describe_frame(frame, project_root)
+            if len(cache) >= FRAME_CACHE_SIZE:
+                cache.clear()
+            cache[key] = info
+            _cache_misses += 1
+        if info is not None:
+            frames.append(info)
+        frame = frame.f_back
+    # Counted without a lock, so concurrent captures may lose a few
+    _cache_hits += hits
+    frames.reverse()
+    return frames
+
+
+def frame_cache_stats():
+    """Frames served from the cache, frames looked up, and frames cached now"""
+    return {"hits": _cache_hits, "misses": _cache_misses, "size": len(_frame_cache)}
+
+
+def resolve_stack(frames):
+    """Turn captured frames into the logged stack_trace, reading each frame's source line"""
+    stack_info = []
+    for filename, lineno, function in frames:
+        line = linecache.getline(filename, lineno)
+        stack_info.append(
+            {
+                "filename": filename,
+                "lineno": lineno,
+                "code_context": [line] if line else [],
+                "function": function,
+            }
+        )
+    return stack_info
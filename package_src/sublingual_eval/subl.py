@@ -5,6 +5,7 @@ import sys
 from sublingual_eval.wrapper_exec import main as wrapper_python
 from sublingual_eval.wrapper_generic import main as wrapper_generic
 from sublingual_dashboard.run_servers import main as server_main
+from sublingual_eval import log_tools
 import os
 
 
@@ -43,6 +44,87 @@ def main():
         )
         args = parser.parse_args()
         server_main(args)
+    elif len(sys.argv) > 1 and sys.argv[1] == "logs":
+        # Handle log maintenance commands
+        parser.add_argument("command", help="Command to run (logs)")
+        subparsers = parser.add_subparsers(dest="logs_command", required=True)
+
+        merge_parser = subparsers.add_parser(
+            "merge", help="Merge per-process log segments into one stream"
+        )
+        merge_parser.add_argument(
+            "segments",
+            nargs="*",
+            help="Segments to merge (default: every segment in the project's logs directory)",
+        )
+        merge_parser.add_argument(
+            "--project-dir",
+            help="Directory containing the Sublingual project files",
+            default=os.path.join(os.getcwd(), ".sublingual"),
+            type=str,
+        )
+        merge_parser.add_argument(
+            "--output",
+            "-o",
+            type=str,
+            default=None,
+            help="File to write the merged log to (default: stdout)",
+        )
+        merge_parser.set_defaults(func=log_tools.merge_command)
+
+        repair_parser = subparsers.add_parser(
+            "repair", help="Cut torn records off the end of log segments"
+        )
+        repair_parser.add_argument(
+            "segments",
+            nargs="*",
+            help="Segments to repair (default: every segment in the project's logs directory)",
+        )
+        repair_parser.add_argument(
+            "--project-dir",
+            help="Directory containing the Sublingual project files",
+            default=os.path.join(os.getcwd(), ".sublingual"),
+            type=str,
+        )
+        repair_parser.add_argument(
+            "--force",
+            action="store_true",
+            help="Also repair segments whose process is still running",
+        )
+        repair_parser.set_defaults(func=log_tools.repair_command)
+
+        convert_parser = subparsers.add_parser(
+            "convert",
+            help="Convert log segments to a Parquet or Arrow file (needs pyarrow)",
+        )
+        convert_parser.add_argument(
+            "segments",
+            nargs="*",
+            help="Segments to convert (default: every segment in the project's logs directory)",
+        )
+        convert_parser.add_argument(
+            "--project-dir",
+            help="Directory containing the Sublingual project files",
+            default=os.path.join(os.getcwd(), ".sublingual"),
+            type=str,
+        )
+        convert_parser.add_argument(
+            "--output",
+            "-o",
+            type=str,
+            required=True,
+            help="File to write, e.g. logs.parquet or logs.arrow",
+        )
+        convert_parser.add_argument(
+            "--format",
+            choices=["parquet", "arrow"],
+            default=None,
+            help="Output format (default: from the output file's extension)",
+        )
+        convert_parser.set_defaults(func=log_tools.convert_command)
+
+        args = parser.parse_args()
+        sys.exit(args.func(args))
     else:
         # Handle script execution - let wrapper_main handle the args
 
@@ -0,0 +1,59 @@
+import os
+import tempfile
+import unittest
+
+from sublingual_eval.logging.blob_store import (
+    BlobStore,
+    externalize_messages,
+    resolve_blob_refs,
+)
+
+
+class TestBlobStore(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.store = BlobStore(os.path.join(self.tmp.name, "blobs"))
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_repeated_content_stored_once(self):
+        system = "You are a helpful assistant. " * 100
+        for question in ("a", "b", "c"):
+            externalize_messages(
+                [{"role": "system", "content": system}, {"role": "user", "content": question}],
+                self.store,
+                min_bytes=1024,
+            )
+        blobs = [f for _, _, files in os.walk(self.store.root) for f in files]
+        self.assertEqual(len(blobs), 1)
+
+    def test_round_trip(self):
+        messages = [
+            {"role": "system", "content": "s" * 2000},
+            {"role": "user", "content": [{"type": "text", "text": "t" * 2000}, {"type": "text", "text": "hi"}]},
+            {"role": "user", "content": "short"},
+        ]
+        stored = externalize_messages(messages, self.store, min_bytes=1024)
+        self.assertEqual(stored[0]["content"]["bytes"], 2000)
+        self.assertIs(stored[2], messages[2])
+        self.assertEqual(resolve_blob_refs(stored, self.store), messages)
+
+    def test_only_digests_resolved(self):
+        secret = os.path.join(self.tmp.name, "secret")
+        with open(secret, "w") as f:
+            f.write("secret")
+        os.makedirs(self.store.root)
+        for ref in (os.path.relpath(secret, os.path.join(self.store.root, "se")), secret, 5):
+            with self.subTest(ref=ref):
+                record = {"content": {"$blob": ref, "bytes": 6}}
+                self.assertEqual(resolve_blob_refs(record, self.store), record)
+
+    def test_input_not_modified(self):
+        messages = [{"role": "system", "content": "s" * 2000}]
+        externalize_messages(messages, self.store, min_bytes=1024)
+        self.assertEqual(messages[0]["content"], "s" * 2000)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,121 @@
+import gzip
+import json
+import os
+import sys
+import tempfile
+import threading
+import unittest
+from unittest import mock
+
+from flask import Flask
+from werkzeug.serving import make_server
+
+from sublingual_eval.logging.http_sink import HttpSink
+
+# The dashboard server runs from its own directory and imports its modules by name
+sys.path.insert(
+    0,
+    os.path.join(os.path.dirname(__file__), "..", "..", "..", "sublingual_dashboard", "server"),
+)
+import api_routes  # noqa: E402
+import config  # noqa: E402
+
+
+def call_record(i):
+    return {"log_id": str(i), "session_id": None, "timestamp": 1700000000 + i}
+
+
+class TestDashboardApi(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.logs_dir = os.path.join(self.tmp.name, "logs")
+        os.makedirs(self.logs_dir)
+        config.set_project_dir(self.tmp.name)
+        self.app = Flask(__name__)
+        self.app.register_blueprint(api_routes.router, url_prefix="/api")
+        self.client = self.app.test_client()
+
+    def tearDown(self):
+        api_routes.close_ingest_sink()
+        self.tmp.cleanup()
+
+    def ingest(self, records, **kwargs):
+        body = b"".join(
+            (r if isinstance(r, bytes) else json.dumps(r).encode()) + b"\n" for r in records
+        )
+        return self.client.post("/api/ingest", data=gzip.compress(body), headers={
+            "Content-Encoding": "gzip", **kwargs.pop("headers", {})
+        }, **kwargs)
+
+    def all_logs(self):
+        return self.client.get("/api/get_logs_in_range").get_json()
+
+    def write_segment(self, records):
+        path = os.path.join(self.logs_dir, "2026-01-01_00-00-00_1.jsonl")
+        with open(path, "w") as f:
+            for record in records:
+                f.write((record if isinstance(record, str) else json.dumps(record)) + "\n")
+        return path
+
+    def test_malformed_lines_skipped(self):
+        path = self.write_segment([
+            {"log_id": "a", "session_id": "s", "timestamp": 1},
+            {"log_id": "b", "timestamp": 2},
+            {"log_id": "c", "session_id": None, "timestamp": 3, "messages": [{"$truncated": 5}]},
+            '{"log_id": "d", "sess',
+        ])
+        response = self.client.get("/api/get_log", query_string={"filename": path})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([r["log_id"] for r in response.get_json()], ["a", "b"])
+        self.assertIsNone(response.get_json()[1]["session_id"])
+        self.assertEqual(response.headers["X-Subl-Skipped-Lines"], "2")
+
+    def test_ingest_needs_token_or_loopback(self):
+        remote = {"environ_base": {"REMOTE_ADDR": "10.0.0.5"}}
+        self.assertEqual(self.ingest([call_record(0)], **remote).status_code, 403)
+        self.assertEqual(self.ingest([call_record(0)]).status_code, 200)
+        with mock.patch.dict(os.environ, {"SUBL_INGEST_TOKEN": "t"}):
+            self.assertEqual(self.ingest([call_record(1)], **remote).status_code, 401)
+            response = self.ingest(
+                [call_record(2)], headers={"Authorization": "Bearer t"}, **remote
+            )
+            self.assertEqual(response.status_code, 200)
+        self.assertEqual([r["log_id"] for r in self.all_logs()], ["0", "2"])
+
+    def test_ingest_size_limit(self):
+        with mock.patch.object(api_routes, "MAX_INGEST_BYTES", 100):
+            response = self.client.post("/api/ingest", data=b"x" * 101)
+            self.assertEqual(response.status_code, 413)
+            # Small compressed, too big once decompressed
+            self.assertEqual(self.ingest([call_record(i) for i in range(10)]).status_code, 413)
+        self.assertEqual(self.all_logs(), [])
+
+    def test_ingest_skips_malformed_records(self):
+        response = self.ingest([
+            call_record(0),
+            {"log_id": "a", "timestamp": 5},
+            {"record_type": "capture_stats", "dropped": 1},
+            [1, 2],
+            b"not json",
+        ])
+        self.assertEqual(response.get_json(), {"received": 1, "skipped": 4})
+        self.assertEqual([r["log_id"] for r in self.all_logs()], ["0"])
+
+    def test_http_sink_round_trip(self):
+        server = make_server("127.0.0.1", 0, self.app, threaded=True)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        self.addCleanup(server.shutdown)
+        sink = HttpSink(f"http://127.0.0.1:{server.server_port}/api/ingest")
+        sink.write(self.logs_dir, [call_record(i) for i in range(3)], [])
+        sink.close()
+        (segment,) = os.listdir(self.logs_dir)
+        response = self.client.get(
+            "/api/get_log", query_string={"filename": os.path.join(self.logs_dir, segment)}
+        )
+        records = response.get_json()
+        self.assertEqual([r["log_id"] for r in records], ["0", "1", "2"])
+        self.assertIn("source_host", records[0])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,44 @@
+import os
+import unittest
+from unittest import mock
+
+import sublingual_eval
+from sublingual_eval.logging import governor as governor_module
+from sublingual_eval.logging.governor import CAPTURE_LEVELS, SAMPLED, Governor, governor_from_env
+
+
+class TestGovernor(unittest.TestCase):
+    def run_calls(self, governor, n, cpu_us):
+        admitted = 0
+        for _ in range(n):
+            if governor.admit() is not None:
+                governor.record(cpu_us * 1000)
+                admitted += 1
+        return admitted
+
+    def test_steps_down_over_budget_and_back_up(self):
+        governor = Governor(budget_us=100, window=10, sample_rate=0.1)
+        self.run_calls(governor, 10, cpu_us=500)
+        self.assertEqual(CAPTURE_LEVELS[governor.level], "no_grammar")
+        self.run_calls(governor, 20, cpu_us=500)
+        self.assertEqual(governor.level, SAMPLED)
+        self.run_calls(governor, 10, cpu_us=20)
+        self.assertEqual(CAPTURE_LEVELS[governor.level], "no_stack")
+
+    def test_sampled_level_skips_most_calls(self):
+        governor = Governor(budget_us=100, window=10**6, sample_rate=0.1)
+        governor.level = SAMPLED
+        admitted = self.run_calls(governor, 2000, cpu_us=500)
+        self.assertGreater(admitted, 100)
+        self.assertLess(admitted, 300)
+
+    def test_level_in_stats(self):
+        self.addCleanup(setattr, governor_module, "_governor", None)
+        with mock.patch.dict(os.environ, {"SUBL_CAPTURE_BUDGET_US": "100"}):
+            governor = governor_from_env()
+        governor.level = SAMPLED
+        self.assertEqual(sublingual_eval.stats()["governor"], {"capture_level": "sampled"})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,113 @@
+import gzip
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from sublingual_eval.logging.http_sink import HttpSink, spool_dir
+from sublingual_eval.logging.log_writer import LogWriter
+
+
+class Collector(BaseHTTPRequestHandler):
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers["Content-Length"]))
+        self.server.received.extend(
+            json.loads(line) for line in gzip.decompress(body).splitlines()
+        )
+        self.send_response(200)
+        self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+
+class TestHttpSink(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.logs_dir = os.path.join(self.tmp.name, "logs")
+        # Find a free port, leaving nothing listening on it for now
+        with socket.socket() as s:
+            s.bind(("127.0.0.1", 0))
+            self.port = s.getsockname()[1]
+        self.url = f"http://127.0.0.1:{self.port}/api/ingest"
+        self.received = []
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def start_server(self):
+        server = ThreadingHTTPServer(("127.0.0.1", self.port), Collector)
+        server.received = self.received
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+
+    def test_records_are_posted(self):
+        self.start_server()
+        writer = LogWriter(sinks=[HttpSink(self.url)])
+        for i in range(5):
+            writer.submit(self.logs_dir, {"i": i})
+        writer.close()
+        self.assertEqual([r["i"] for r in self.received], list(range(5)))
+        self.assertIn("source_host", self.received[0])
+
+    def test_spooled_while_collector_is_down(self):
+        sink = HttpSink(self.url, timeout_s=1, min_backoff_s=0)
+        # Nothing is accepting connections yet
+        sink.write(self.logs_dir, [{"i": 0}], [])
+        sink.write(self.logs_dir, [{"i": 1}], [])
+        sink._queue.join()
+        self.assertEqual(len(os.listdir(spool_dir(self.logs_dir))), 2)
+
+        self.start_server()
+        sink.write(self.logs_dir, [{"i": 2}], [])
+        sink._queue.join()
+        self.assertEqual([r["i"] for r in self.received], [0, 1, 2])
+        self.assertEqual(os.listdir(spool_dir(self.logs_dir)), [])
+
+    def test_batches_of_killed_senders_are_reclaimed(self):
+        directory = spool_dir(self.logs_dir)
+        os.makedirs(directory)
+        dead = subprocess.run([sys.executable, "-c", "import os; print(os.getpid())"],
+                              capture_output=True, text=True).stdout.strip()
+        body = gzip.compress(json.dumps({"i": 0}).encode() + b"\n")
+        with open(os.path.join(directory, f"{1:020d}_1_0.jsonl.gz.{dead}.sending"), "wb") as f:
+            f.write(body)
+        self.start_server()
+        sink = HttpSink(self.url, min_backoff_s=0)
+        sink.write(self.logs_dir, [{"i": 1}], [])
+        sink._queue.join()
+        self.assertEqual([r["i"] for r in self.received], [0, 1])
+        self.assertEqual(os.listdir(directory), [])
+
+    def test_spool_cap(self):
+        sink = HttpSink(self.url, max_spool_bytes=100)
+        directory = spool_dir(self.logs_dir)
+        sink._spool(directory, b"x" * 60, 1)
+        with self.assertRaises(OSError):
+            sink._spool(directory, b"x" * 60, 2)
+        self.assertEqual(len(os.listdir(directory)), 1)
+
+    def test_writes_dont_wait_for_a_stalled_collector(self):
+        # Accepts connections but never answers
+        listener = socket.socket()
+        listener.bind(("127.0.0.1", self.port))
+        listener.listen()
+        self.addCleanup(listener.close)
+        sink = HttpSink(self.url, timeout_s=1, max_queued_batches=1)
+        start = time.monotonic()
+        for i in range(5):
+            sink.write(self.logs_dir, [{"i": i}], [])
+        self.assertLess(time.monotonic() - start, 0.5)
+        sink.close()
+        self.assertEqual(len(os.listdir(spool_dir(self.logs_dir))), 5)
+
+
+if __name__ == "__main__":
+    unittest.main()
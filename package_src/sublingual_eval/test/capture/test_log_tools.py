@@ -0,0 +1,137 @@
+import io
+import json
+import os
+import tempfile
+import unittest
+
+from sublingual_eval import log_tools
+from sublingual_eval.logging import columnar
+from sublingual_eval.logging.log_writer import LogWriter
+from sublingual_eval.logging.segments import iter_segment_lines, read_block_index
+
+
+class TestMergeSegments(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def write_segment(self, name, lines):
+        path = os.path.join(self.tmp.name, name)
+        with open(path, "w") as f:
+            f.write("".join(lines))
+        return path
+
+    def test_merge_orders_by_timestamp(self):
+        a = self.write_segment(
+            "a.jsonl", [json.dumps({"timestamp": t, "src": "a"}) + "\n" for t in (1, 4, 6)]
+        )
+        b = self.write_segment(
+            "b.jsonl", [json.dumps({"timestamp": t, "src": "b"}) + "\n" for t in (2, 3, 7)]
+        )
+        out = io.BytesIO()
+        count = log_tools.merge_segments([a, b], out)
+        records = [json.loads(line) for line in out.getvalue().splitlines()]
+        self.assertEqual(count, 6)
+        self.assertEqual([r["timestamp"] for r in records], [1, 2, 3, 4, 6, 7])
+
+    def test_merge_skips_unreadable_lines(self):
+        a = self.write_segment(
+            "a.jsonl", [json.dumps({"timestamp": 1}) + "\n", '{"timestamp": 2, "mess']
+        )
+        out = io.BytesIO()
+        self.assertEqual(log_tools.merge_segments([a], out), 1)
+
+    def test_list_segments(self):
+        self.write_segment("b.jsonl", [])
+        self.write_segment("a.jsonl", [])
+        self.write_segment("notes.txt", [])
+        names = [os.path.basename(p) for p in log_tools.list_segments(self.tmp.name)]
+        self.assertEqual(names, ["a.jsonl", "b.jsonl"])
+
+
+class TestRepairSegments(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.logs_dir = os.path.join(self.tmp.name, "logs")
+        os.makedirs(self.logs_dir)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_repair_plain_segment(self):
+        path = os.path.join(self.logs_dir, "a.jsonl")
+        lines = "".join(json.dumps({"i": i, "pad": "x" * 1000}) + "\n" for i in range(200))
+        with open(path, "w") as f:
+            f.write(lines + '{"i": 200, "pa')
+        self.assertEqual(log_tools.repair_segment(path), len('{"i": 200, "pa'))
+        with open(path) as f:
+            self.assertEqual(f.read(), lines)
+        # Nothing left to repair
+        self.assertEqual(log_tools.repair_segment(path), 0)
+
+    def test_repair_compressed_segment(self):
+        writer = LogWriter(compression="gzip")
+        for i in range(3):
+            writer.submit(self.logs_dir, {"i": i, "timestamp": 1000 + i})
+            writer.flush(timeout=5)
+        writer.close()
+        (path,) = log_tools.list_segments(self.logs_dir)
+        # Simulate a crash while the last block and its index entry were written
+        with open(path, "r+b") as f:
+            f.truncate(os.path.getsize(path) - 5)
+        with open(path + ".idx", "r+b") as f:
+            f.truncate(os.path.getsize(path + ".idx") - 5)
+
+        self.assertGreater(log_tools.repair_segment(path), 0)
+        records = [json.loads(line) for line in iter_segment_lines(path)]
+        self.assertEqual([r["i"] for r in records], [0, 1])
+        self.assertEqual(len(read_block_index(path)), 2)
+
+
+@unittest.skipIf(columnar.pyarrow is None, "needs pyarrow")
+class TestConvertSegments(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.logs_dir = os.path.join(self.tmp.name, "logs")
+        os.makedirs(self.logs_dir)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_convert_to_parquet(self):
+        import pyarrow.parquet
+
+        writer = LogWriter(intern_stacks=True)
+        for i in range(3):
+            writer.submit(
+                self.logs_dir,
+                {
+                    "log_id": str(i),
+                    "session_id": None,
+                    "messages": [{"role": "user", "content": "hi"}],
+                    "usage": {"prompt_tokens": 1, "completion_tokens": i, "total_tokens": 1 + i},
+                    "timestamp": 1700000000 + i,
+                    "duration_ms": 12.5,
+                    "stack_trace": [{"filename": "app.py", "lineno": 3, "function": "f"}],
+                    "call_parameters": {"model": "gpt-4o"},
+                    "custom": True,
+                },
+            )
+        writer.close()
+        output = os.path.join(self.tmp.name, "logs.parquet")
+        count, skipped = columnar.convert_segments(
+            log_tools.list_segments(self.logs_dir), output, "parquet"
+        )
+        self.assertEqual((count, skipped), (3, 0))
+        rows = pyarrow.parquet.read_table(output).to_pylist()
+        self.assertEqual([r["total_tokens"] for r in rows], [1, 2, 3])
+        self.assertEqual(rows[0]["call_site"], "app.py:3")
+        self.assertEqual(rows[0]["model"], "gpt-4o")
+        self.assertEqual(json.loads(rows[0]["messages"]), [{"role": "user", "content": "hi"}])
+        self.assertEqual(json.loads(rows[0]["other_fields"]), {"custom": True})
+
+
+if __name__ == "__main__":
+    unittest.main()
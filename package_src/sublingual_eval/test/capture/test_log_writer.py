@@ -0,0 +1,295 @@
+import asyncio
+import json
+import os
+import tempfile
+import threading
+import time
+import unittest
+from unittest import mock
+
+from sublingual_eval.logging.interning import join_grammar, load_intern_table
+from sublingual_eval.logging.log_writer import LogWriter
+from sublingual_eval.logging.segments import (
+    iter_segment_lines,
+    read_block_index,
+    read_manifest,
+    segments_in_range,
+)
+
+
+class TestLogWriter(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, "logs")
+        os.makedirs(self.path)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def segments(self):
+        return sorted(os.listdir(self.path))
+
+    def read_records(self):
+        records = []
+        for name in self.segments():
+            with open(os.path.join(self.path, name)) as f:
+                records.extend(json.loads(line) for line in f)
+        return records
+
+    def test_records_written_in_order(self):
+        writer = LogWriter()
+        for i in range(100):
+            writer.submit(self.path, {"i": i})
+        self.assertTrue(writer.flush(timeout=5))
+        self.assertEqual([r["i"] for r in self.read_records()], list(range(100)))
+        writer.close()
+
+    def test_close_drains_queue(self):
+        writer = LogWriter(max_queue_size=10)
+        for i in range(50):
+            writer.submit(self.path, {"i": i})
+        writer.close()
+        # Callers may have waited for room, which is logged as capture stats
+        records = [r for r in self.read_records() if "record_type" not in r]
+        self.assertEqual(len(records), 50)
+
+    def test_submit_after_close_is_ignored(self):
+        writer = LogWriter()
+        writer.submit(self.path, {"i": 0})
+        writer.close()
+        writer.submit(self.path, {"i": 1})
+        self.assertEqual(len(self.read_records()), 1)
+
+    def test_group_commit_with_fsync(self):
+        writer = LogWriter(batch_size=8, batch_interval_ms=1000, durability="fsync")
+        for i in range(20):
+            writer.submit(self.path, {"i": i})
+        self.assertTrue(writer.flush(timeout=5))
+        self.assertEqual(len(self.read_records()), 20)
+        writer.close()
+
+    def test_flush_with_no_durability(self):
+        writer = LogWriter(durability="none")
+        writer.submit(self.path, {"i": 0})
+        self.assertTrue(writer.flush(timeout=5))
+        self.assertEqual(self.read_records(), [{"i": 0}])
+        writer.close()
+
+    def test_unknown_durability_rejected(self):
+        with self.assertRaises(ValueError):
+            LogWriter(durability="sometimes")
+
+    def test_rotation_by_size(self):
+        writer = LogWriter(max_segment_bytes=200)
+        for i in range(30):
+            writer.submit(self.path, {"i": i, "timestamp": 1000 + i})
+        writer.close()
+        self.assertGreater(len(self.segments()), 1)
+        self.assertEqual(sorted(r["i"] for r in self.read_records()), list(range(30)))
+
+        manifest = read_manifest(self.path)
+        self.assertEqual(set(manifest), set(self.segments()))
+        self.assertEqual(sum(e["records"] for e in manifest.values()), 30)
+        for name, entry in manifest.items():
+            self.assertEqual(entry["bytes"], os.path.getsize(os.path.join(self.path, name)))
+
+    def test_segments_in_range_skips_closed_segments(self):
+        writer = LogWriter(max_segment_bytes=100)
+        for i in range(10):
+            writer.submit(self.path, {"timestamp": 1000 + i * 100})
+        writer.close()
+        all_segments = segments_in_range(self.path)
+        recent = segments_in_range(self.path, start=1850)
+        self.assertLess(len(recent), len(all_segments))
+        timestamps = []
+        for path in recent:
+            with open(path) as f:
+                timestamps.extend(json.loads(line)["timestamp"] for line in f)
+        self.assertIn(1900, timestamps)
+
+    def test_compressed_segments(self):
+        for compression in ("gzip", "lzma"):
+            with self.subTest(compression=compression):
+                writer = LogWriter(batch_size=10, compression=compression)
+                for i in range(25):
+                    writer.submit(self.path, {"i": i, "timestamp": 1000 + i, "prompt": "x" * 500})
+                writer.close()
+                (segment,) = segments_in_range(self.path)
+                index = read_block_index(segment)
+                self.assertEqual(sum(block["records"] for block in index), 25)
+                self.assertLess(os.path.getsize(segment), 25 * 500)
+                lines = list(iter_segment_lines(segment))
+                self.assertEqual([json.loads(l)["i"] for l in lines], list(range(25)))
+                # Only the blocks overlapping the window are decompressed
+                recent = [json.loads(l)["i"] for l in iter_segment_lines(segment, start=1024)]
+                self.assertIn(24, recent)
+                self.assertLess(len(recent), 25)
+                os.remove(segment)
+                os.remove(segment + ".idx")
+
+    def test_intern_stacks(self):
+        stack = [
+            {"filename": "app.py", "lineno": 3, "code_context": ["main()\n"], "function": "<module>"},
+            {"filename": "app.py", "lineno": 1, "code_context": ["create()\n"], "function": "main"},
+        ]
+        writer = LogWriter(intern_stacks=True)
+        for i in range(5):
+            writer.submit(self.path, {"i": i, "stack_trace": stack})
+        writer.close()
+        records = self.read_records()
+        self.assertNotIn("stack_trace", records[0])
+        self.assertEqual(len({r["stack_id"] for r in records}), 1)
+        table_path = os.path.join(self.tmp.name, "interned", "stacks.jsonl")
+        with open(table_path) as f:
+            self.assertEqual(len(f.readlines()), 1)
+        self.assertEqual(load_intern_table(table_path)[records[0]["stack_id"]], stack)
+
+    def test_intern_grammars(self):
+        def grammar(name):
+            return [{
+                "role": "user",
+                "content": {
+                    "type": "Format",
+                    "base": {"type": "Literal", "value": "hi {}"},
+                    "args": [{"type": "InferredVar", "name": "name", "value": name}],
+                    "kwargs": {},
+                },
+            }]
+
+        stack = [{"filename": "app.py", "lineno": 1, "code_context": [], "function": "main"}]
+        writer = LogWriter(intern_grammars=True, intern_stacks=True)
+        for name in ("ann", "bob", "cy"):
+            writer.submit(self.path, {"grammar_result": grammar(name), "stack_trace": stack})
+        writer.close()
+        records = self.read_records()
+        self.assertEqual(len({r["grammar_id"] for r in records}), 1)
+        self.assertEqual([r["grammar_values"] for r in records], [["ann"], ["bob"], ["cy"]])
+        table = load_intern_table(os.path.join(self.tmp.name, "interned", "grammars.jsonl"))
+        self.assertEqual(len(table), 1)
+        skeleton = table[records[1]["grammar_id"]]
+        self.assertEqual(join_grammar(skeleton, records[1]["grammar_values"]), grammar("bob"))
+
+    def test_unknown_compression_rejected(self):
+        with self.assertRaises(ValueError):
+            LogWriter(compression="rar")
+
+    def test_bad_record_does_not_stop_writer(self):
+        writer = LogWriter()
+        writer.submit(self.path, {"bad": object()})
+        writer.submit(self.path, {"i": 1})
+        writer.close()
+        records = self.read_records()
+        self.assertEqual(records[0], {"i": 1})
+        self.assertEqual(records[-1]["record_type"], "capture_stats")
+        self.assertEqual(records[-1]["write_errors"], 1)
+
+    def fill_blocked_writer(self, overload):
+        """Submit 6 records while the writer is stuck on the first one"""
+        release = threading.Event()
+        writer = LogWriter(max_queue_size=2, batch_interval_ms=0, overload=overload, block_timeout_ms=10)
+        writer.submit(self.path, {"i": 0}, finalize=lambda r: release.wait(5) and r)
+        time.sleep(0.1)
+        for i in range(1, 6):
+            writer.submit(self.path, {"i": i})
+        release.set()
+        writer.close()
+        return self.read_records()
+
+    def test_overload_drop_newest(self):
+        records = self.fill_blocked_writer("drop_newest")
+        self.assertEqual([r["i"] for r in records if "i" in r], [0, 1, 2])
+        self.assertEqual(records[-1]["dropped"], 3)
+
+    def test_overload_drop_oldest(self):
+        records = self.fill_blocked_writer("drop_oldest")
+        self.assertEqual([r["i"] for r in records if "i" in r], [0, 4, 5])
+        self.assertEqual(records[-1]["dropped"], 3)
+
+    def test_overload_block_times_out(self):
+        records = self.fill_blocked_writer("block")
+        self.assertEqual([r["i"] for r in records if "i" in r], [0, 1, 2])
+        self.assertEqual(records[-1]["delayed"], 3)
+        self.assertEqual(records[-1]["dropped"], 3)
+
+    def test_flush_times_out_on_full_queue(self):
+        release = threading.Event()
+        writer = LogWriter(max_queue_size=1, batch_interval_ms=0, overload="drop_newest")
+        writer.submit(self.path, {"i": 0}, finalize=lambda r: release.wait(5) and r)
+        time.sleep(0.1)
+        writer.submit(self.path, {"i": 1})
+        start = time.monotonic()
+        self.assertFalse(writer.flush(timeout=0.1))
+        self.assertLess(time.monotonic() - start, 1)
+        release.set()
+        writer.close()
+
+    def test_no_stats_record_without_overload(self):
+        writer = LogWriter()
+        writer.submit(self.path, {"i": 0})
+        writer.close()
+        self.assertEqual(self.read_records(), [{"i": 0}])
+
+    def test_asubmit_does_not_block_the_event_loop(self):
+        release = threading.Event()
+        writer = LogWriter(max_queue_size=1, batch_interval_ms=0, block_timeout_ms=2000)
+        writer.submit(self.path, {"i": 0}, finalize=lambda r: release.wait(5) and r)
+        time.sleep(0.1)
+        writer.submit(self.path, {"i": 1})  # fills the queue
+
+        async def main():
+            ticks = 0
+
+            async def tick():
+                nonlocal ticks
+                while True:
+                    ticks += 1
+                    await asyncio.sleep(0.01)
+
+            ticker = asyncio.create_task(tick())
+            submit = asyncio.create_task(writer.asubmit(self.path, {"i": 2}))
+            # Waiting for room uses none of the default executor's threads
+            loop = asyncio.get_running_loop()
+            with mock.patch.object(loop, "run_in_executor", side_effect=AssertionError):
+                await asyncio.sleep(0.2)
+            self.assertFalse(submit.done())
+            self.assertGreater(ticks, 5)
+            release.set()
+            await submit
+            self.assertTrue(await writer.aflush(timeout=5))
+            ticker.cancel()
+
+        asyncio.run(main())
+        writer.close()
+        self.assertEqual([r["i"] for r in self.read_records() if "i" in r], [0, 1, 2])
+
+    @unittest.skipUnless(hasattr(os, "fork"), "needs os.fork")
+    def test_forked_child_writes_its_own_segment(self):
+        writer = LogWriter(durability="none")
+        writer.submit(self.path, {"i": 0})
+        writer.flush(timeout=5)  # leaves the record in the file buffer
+        pid = os.fork()
+        if pid == 0:
+            try:
+                writer.submit(self.path, {"i": "child"})
+                writer.close()
+            finally:
+                os._exit(0)
+        os.waitpid(pid, 0)
+        writer.submit(self.path, {"i": 1})
+        writer.close()
+        self.assertEqual(len(self.segments()), 2)
+        self.assertCountEqual(
+            [r["i"] for r in self.read_records()], [0, 1, "child"]
+        )
+        self.assertEqual(
+            sorted(e["pid"] for e in read_manifest(self.path).values()),
+            sorted([os.getpid(), pid]),
+        )
+
+    def test_unknown_overload_rejected(self):
+        with self.assertRaises(ValueError):
+            LogWriter(overload="panic")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,43 @@
+import json
+import os
+import tempfile
+import unittest
+
+import sublingual_eval
+from sublingual_eval.logging.log_writer import LogWriter
+from sublingual_eval.logging.overhead import Histogram, phase_stats, record_phase
+
+
+class TestOverhead(unittest.TestCase):
+    def test_histogram_percentiles(self):
+        histogram = Histogram()
+        for us in [3] * 90 + [40] * 9 + [300000]:
+            histogram.add(us * 1000)
+        self.assertEqual(
+            histogram.summary(),
+            {"count": 100, "mean_us": 3006.3, "p50_us": 5, "p90_us": 5, "p99_us": 50, "max_us": 300000.0},
+        )
+
+    def test_stats_api(self):
+        before = phase_stats().get("grammar", {}).get("count", 0)
+        record_phase("grammar", 1500)
+        stats = sublingual_eval.stats()
+        self.assertEqual(stats["phases"]["grammar"]["count"], before + 1)
+        self.assertIn("hits", stats["frame_cache"])
+
+    def test_summary_records(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            writer = LogWriter(overhead_stats=True)
+            writer.submit(tmp, {"i": 0})
+            writer.close()
+            records = []
+            for name in os.listdir(tmp):
+                with open(os.path.join(tmp, name)) as f:
+                    records.extend(json.loads(line) for line in f)
+        overhead = [r for r in records if r.get("record_type") == "capture_overhead"]
+        self.assertEqual(len(overhead), 1)
+        self.assertGreaterEqual(overhead[0]["phases"]["serialize"]["count"], 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
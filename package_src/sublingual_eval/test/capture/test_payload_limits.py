@@ -0,0 +1,128 @@
+import copy
+import hashlib
+import json
+import os
+import tempfile
+import unittest
+
+from openai.types.chat import ChatCompletion
+
+from sublingual_eval.logging.blob_store import BlobStore, blobs_dir, resolve_blob_refs
+from sublingual_eval.logging.log_writer import LogWriter
+from sublingual_eval.logging.payload_limits import PayloadLimiter, describe_truncated
+from sublingual_eval.logging.sinks import JsonlSink, Sink
+
+
+def record(content, value):
+    return {
+        "messages": [{"role": "user", "content": content}],
+        "grammar_result": [{
+            "role": "user",
+            "content": {"type": "InferredVar", "name": "docs", "value": value},
+        }],
+        "model": "gpt-4o",
+    }
+
+
+def completion(content):
+    return ChatCompletion.model_validate({
+        "id": "c1",
+        "object": "chat.completion",
+        "created": 1700000000,
+        "model": "gpt-4o",
+        "choices": [{
+            "index": 0,
+            "finish_reason": "stop",
+            "message": {"role": "assistant", "content": content},
+        }],
+    })
+
+
+class TestPayloadLimits(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.store = BlobStore(os.path.join(self.tmp.name, "blobs"))
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_truncated_with_length_and_hash(self):
+        original = record("é" * 1000, "short")
+        unchanged = copy.deepcopy(original)
+        limited = PayloadLimiter(max_field_bytes=100).limit(original)
+        content = limited["messages"][0]["content"]
+        data = ("é" * 1000).encode("utf-8")
+        self.assertEqual(content["$truncated"]["bytes"], len(data))
+        self.assertEqual(content["$truncated"]["sha256"], hashlib.sha256(data).hexdigest())
+        self.assertEqual(content["text"], "é" * 50)
+        self.assertIs(limited["grammar_result"], original["grammar_result"])
+        self.assertEqual(original, unchanged)
+        self.assertTrue(describe_truncated(limited)["messages"][0]["content"].startswith("é" * 50 + "…"))
+
+    def test_small_record_returned_as_is(self):
+        original = record("hi", "short")
+        self.assertIs(PayloadLimiter(100, 100).limit(original), original)
+
+    def test_inferred_var_values(self):
+        limiter = PayloadLimiter(max_field_bytes=10000, max_var_bytes=100)
+        limited = limiter.limit(record("hi", [{"chunk": "x" * 50}] * 10))
+        value = limited["grammar_result"][0]["content"]["value"]
+        self.assertEqual(len(value["text"]), 100)
+        self.assertGreater(value["$truncated"]["bytes"], 500)
+        # Values JSON can't encode are logged as their str()
+        limited = limiter.limit(record("hi", object()))
+        self.assertTrue(limited["grammar_result"][0]["content"]["value"].startswith("<object"))
+
+    def test_sdk_response_capped(self):
+        limited = PayloadLimiter(max_field_bytes=100).limit({"response": completion("y" * 1000)})
+        message = limited["response"]["choices"][0]["message"]
+        self.assertEqual(message["content"]["$truncated"]["bytes"], 1000)
+        self.assertEqual(message["role"], "assistant")
+
+    def test_small_sdk_response_left_to_the_serializer(self):
+        class Recorder(Sink):
+            name = "recorder"
+            records = []
+
+            def write(self, logs_dir, records, lines):
+                self.records.extend(records)
+
+        response = completion("y" * 1000)
+        # The limits get_log_writer applies by default
+        writer = LogWriter(sinks=[Recorder()], max_field_bytes=1 << 20, max_var_bytes=65536)
+        writer.submit(self.tmp.name, {"response": response})
+        writer.close()
+        self.assertIs(Recorder.records[0]["response"], response)
+
+    def test_blob_mode(self):
+        limited = PayloadLimiter(max_field_bytes=100, mode="blob").limit(
+            record("x" * 1000, "short"), self.store
+        )
+        self.assertEqual(limited["messages"][0]["content"]["bytes"], 1000)
+        self.assertEqual(resolve_blob_refs(limited, self.store), record("x" * 1000, "short"))
+
+    def test_blob_refs_stay_local(self):
+        class Recorder(Sink):
+            name = "recorder"
+            records = []
+
+            def write(self, logs_dir, records, lines):
+                self.records.extend(records)
+
+        logs_dir = os.path.join(self.tmp.name, "logs")
+        os.makedirs(logs_dir)
+        writer = LogWriter(
+            sinks=[JsonlSink(), Recorder()], max_field_bytes=100, oversize="blob"
+        )
+        writer.submit(logs_dir, record("x" * 1000, "short"))
+        writer.close()
+        (segment,) = os.listdir(logs_dir)
+        with open(os.path.join(logs_dir, segment)) as f:
+            local = json.loads(f.readline())
+        store = BlobStore(blobs_dir(logs_dir))
+        self.assertEqual(resolve_blob_refs(local, store), record("x" * 1000, "short"))
+        self.assertEqual(Recorder.records[0]["messages"][0]["content"]["$truncated"]["bytes"], 1000)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,61 @@
+import base64
+import copy
+import hashlib
+import unittest
+
+from sublingual_eval.logging.redaction import REMOVED_PLACEHOLDER, redact_messages
+
+PNG = b"\x89PNG" + bytes(range(256)) * 40
+PNG_B64 = base64.b64encode(PNG).decode()
+
+
+class TestRedaction(unittest.TestCase):
+    def test_openai_image_and_audio(self):
+        messages = [
+            {"role": "system", "content": "Describe it"},
+            {"role": "user", "content": [
+                {"type": "text", "text": "What is this?"},
+                {"type": "image_url", "image_url": {"url": f"data:image/png;base64,{PNG_B64}", "detail": "low"}},
+                {"type": "input_audio", "input_audio": {"data": PNG_B64, "format": "wav"}},
+            ]},
+        ]
+        original = copy.deepcopy(messages)
+        redacted = redact_messages(messages)
+        # The caller's messages, including the nested dicts, are untouched
+        self.assertEqual(messages, original)
+        self.assertIs(redacted[0], messages[0])
+        self.assertIs(redacted[1]["content"][0], messages[1]["content"][0])
+
+        image = redacted[1]["content"][1]["image_url"]
+        self.assertEqual(image["url"], REMOVED_PLACEHOLDER)
+        self.assertEqual(image["detail"], "low")
+        self.assertEqual(
+            image["redacted"],
+            {"bytes": len(PNG), "sha256": hashlib.sha256(PNG).hexdigest(), "media_type": "image/png"},
+        )
+        audio = redacted[1]["content"][2]["input_audio"]
+        self.assertNotIn("data", audio)
+        self.assertEqual(audio["redacted"]["media_type"], "audio/wav")
+
+    def test_anthropic_base64_sources(self):
+        image = {"type": "image", "source": {"type": "base64", "media_type": "image/png", "data": PNG_B64}}
+        messages = [{"role": "user", "content": [
+            image,
+            {"type": "tool_result", "tool_use_id": "t1", "content": [image]},
+            {"type": "image", "source": {"type": "url", "url": "https://example.com/a.png"}},
+        ]}]
+        redacted = redact_messages(messages)
+        content = redacted[0]["content"]
+        self.assertNotIn("data", content[0]["source"])
+        self.assertEqual(content[0]["source"]["redacted"]["bytes"], len(PNG))
+        self.assertNotIn("data", content[1]["content"][0]["source"])
+        self.assertIs(content[2], messages[0]["content"][2])
+        self.assertIn("data", image["source"])
+
+    def test_nothing_to_redact(self):
+        messages = [{"role": "user", "content": [{"type": "text", "text": "hi"}]}]
+        self.assertIs(redact_messages(messages), messages)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,76 @@
+import inspect
+import os
+import unittest
+from unittest import mock
+
+from anthropic.resources.messages import Messages
+
+from sublingual_eval.logging import anthropic_logger
+from sublingual_eval.logging.openai_logger import request_id_ctx_var
+from sublingual_eval.logging.sampling import Sampler, parse_call_site_rates, sampler_from_env
+
+
+def call_site():
+    return inspect.currentframe()
+
+
+class TestSampling(unittest.TestCase):
+    def test_rate(self):
+        sampler = Sampler(rate=0.25)
+        kept = sum(sampler.keep(call_site()) for _ in range(4000))
+        self.assertGreater(kept, 800)
+        self.assertLess(kept, 1200)
+        self.assertEqual(sampler.stats(), {"kept": kept, "skipped": 4000 - kept})
+
+    def test_sessions_kept_or_dropped_whole(self):
+        sampler = Sampler(rate=0.5, by_session=True)
+        for session_id in ("a", "b", "c", "d"):
+            decisions = {sampler.keep(call_site(), session_id) for _ in range(20)}
+            self.assertEqual(len(decisions), 1)
+
+    def test_anthropic_sessions_kept_or_dropped_whole(self):
+        written = []
+        with mock.patch.object(Messages, "create", lambda self, *args, **kwargs: None), \
+                mock.patch.object(anthropic_logger, "write_logged_data",
+                                  lambda path, data: written.append(data)):
+            anthropic_logger.setup_anthropic_logging("logs", Sampler(rate=0.5, by_session=True))
+            for session_id in ("a", "b", "c", "d", "e", "f"):
+                token = request_id_ctx_var.set(session_id)
+                for _ in range(20):
+                    Messages.create(None, messages=[])
+                request_id_ctx_var.reset(token)
+        counts = {}
+        for record in written:
+            counts[record["session_id"]] = counts.get(record["session_id"], 0) + 1
+        self.assertTrue(counts)
+        self.assertEqual(set(counts.values()), {20})
+
+    def test_call_site_rates(self):
+        frame = call_site()
+        lineno = frame.f_lineno
+        this_file = "capture/" + os.path.basename(__file__)
+        self.assertFalse(Sampler(call_site_rates={this_file: 0}).keep(frame))
+        self.assertTrue(Sampler(rate=0, call_site_rates={f"{this_file}:{lineno}": 1}).keep(frame))
+        # Nothing matches, so the global rate applies
+        self.assertTrue(Sampler(call_site_rates={f"{this_file}:{lineno + 1}": 0, "other.py": 0}).keep(frame))
+
+    def test_slow_calls_kept(self):
+        sampler = Sampler(rate=0, keep_slow_ms=500)
+        self.assertFalse(sampler.keep(call_site(), duration_ms=100))
+        self.assertTrue(sampler.keep(call_site(), duration_ms=800))
+
+    def test_from_env(self):
+        with mock.patch.dict(os.environ, {}, clear=True):
+            self.assertIsNone(sampler_from_env())
+        env = {"SUBL_SAMPLE_RATE": "0.1", "SUBL_SAMPLE_BY_SESSION": "1", "SUBL_SAMPLE_KEEP_SLOW_MS": "2000"}
+        with mock.patch.dict(os.environ, env, clear=True):
+            sampler = sampler_from_env()
+        self.assertEqual((sampler.rate, sampler.by_session, sampler.keep_slow_ms), (0.1, True, 2000))
+        self.assertEqual(
+            parse_call_site_rates("app/chat.py:42=0.5, app/jobs.py=0,bad,x=2"),
+            {"app/chat.py:42": 0.5, "app/jobs.py": 0.0},
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
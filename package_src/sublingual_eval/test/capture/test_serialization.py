@@ -0,0 +1,65 @@
+import inspect
+import json
+import threading
+import unittest
+from types import SimpleNamespace
+
+from pydantic import BaseModel
+
+from sublingual_eval.abstract.grammar import InferredVar
+from sublingual_eval.logging import openai_logger
+from sublingual_eval.logging.serialization import SERIALIZERS, get_serializer, snapshot
+
+
+class Usage(BaseModel):
+    prompt_tokens: int
+    completion_tokens: int = 0
+
+
+class TestSerializers(unittest.TestCase):
+    def test_serializers_agree(self):
+        record = {
+            "log_id": "abc",
+            "messages": [{"role": "user", "content": "héllo  "}],
+            "usage": Usage(prompt_tokens=3),
+            "timestamp": 1700000000,
+        }
+        expected = {**record, "usage": {"prompt_tokens": 3}}
+        for name, (_, available) in SERIALIZERS.items():
+            if not available():
+                continue
+            with self.subTest(serializer=name):
+                line = get_serializer(name).dumps(record)
+                self.assertIsInstance(line, bytes)
+                self.assertNotIn(b"\n", line)
+                self.assertEqual(json.loads(line), expected)
+
+    def test_unknown_serializer(self):
+        with self.assertRaises(ValueError):
+            get_serializer("pickle")
+
+
+class TestSnapshot(unittest.TestCase):
+    def test_later_changes_dont_reach_the_record(self):
+        docs = ["first"]
+        messages = [{"role": "user", "content": "hi"}]
+        record = openai_logger.create_logged_data(
+            SimpleNamespace(usage=None),
+            (),
+            {"messages": messages},
+            inspect.currentframe(),
+            InferredVar("docs", docs).to_dict(),
+            1,
+        )
+        docs.append("second")
+        messages[0]["content"] = "changed"
+        self.assertEqual(record["grammar_result"]["value"], ["first"])
+        self.assertEqual(record["messages"], [{"role": "user", "content": "hi"}])
+
+    def test_uncopyable_values_become_strings(self):
+        lock = threading.Lock()
+        self.assertEqual(snapshot({"lock": lock, "n": [1]}), {"lock": str(lock), "n": [1]})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,54 @@
+import json
+import os
+import tempfile
+import unittest
+
+from sublingual_eval.logging.log_writer import LogWriter
+from sublingual_eval.logging.sinks import JsonlSink
+from sublingual_eval.logging.sqlite_sink import SqliteSink, database_path, query_records
+
+
+def make_record(i, model, duration_ms):
+    return {
+        "log_id": f"log-{i}",
+        "session_id": "s1" if i % 2 else None,
+        "messages": [{"role": "user", "content": f"question {i}"}],
+        "usage": {"prompt_tokens": 10, "completion_tokens": i, "total_tokens": 10 + i},
+        "timestamp": 1000 + i,
+        "duration_ms": duration_ms,
+        "stack_trace": [{"filename": "app.py", "lineno": 7, "function": "main"}],
+        "call_parameters": {"model": model},
+    }
+
+
+class TestSqliteSink(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.logs_dir = os.path.join(self.tmp.name, "logs")
+        os.makedirs(self.logs_dir)
+        self.db_path = database_path(self.logs_dir)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def query(self, **filters):
+        return [json.loads(line) for line in query_records(self.db_path, **filters)]
+
+    def test_query_by_indexed_columns(self):
+        writer = LogWriter(sinks=[SqliteSink(), JsonlSink()])
+        for i in range(10):
+            writer.submit(self.logs_dir, make_record(i, "gpt-4o" if i < 5 else "o1", 100 * i))
+        writer.close()
+
+        records = self.query(model="o1", min_duration_ms=700)
+        self.assertEqual([r["log_id"] for r in records], ["log-9", "log-8", "log-7"])
+        self.assertEqual(records[0], make_record(9, "o1", 900))
+        self.assertEqual(len(self.query(start=1002, end=1004)), 3)
+        self.assertEqual(len(self.query(session_id="s1", limit=2)), 2)
+        self.assertEqual(len(self.query(call_site="app.py:7")), 10)
+        # The JSONL sink got the same records
+        self.assertEqual(len(os.listdir(self.logs_dir)), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,49 @@
+import inspect
+import os
+import unittest
+
+from sublingual_eval.logging.stack_capture import (
+    capture_stack,
+    frame_cache_stats,
+    resolve_stack,
+)
+
+
+def call_site():
+    return capture_stack(inspect.currentframe())
+
+
+class TestStackCapture(unittest.TestCase):
+    def test_project_frames_outermost_first(self):
+        cwd = os.getcwd()
+        self.addCleanup(os.chdir, cwd)
+        os.chdir(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+        stack = resolve_stack(call_site())
+        self.assertEqual(
+            [f["function"] for f in stack[-2:]],
+            ["test_project_frames_outermost_first", "call_site"],
+        )
+        self.assertEqual(stack[-1]["filename"], __file__)
+        self.assertEqual(stack[-1]["code_context"], ["    return capture_stack(inspect.currentframe())\n"])
+        # unittest itself is installed outside the project
+        self.assertTrue(all("unittest" not in f["filename"] for f in stack))
+
+    def test_repeated_call_site_served_from_cache(self):
+        stacks, misses = [], []
+        for _ in range(2):
+            stacks.append(call_site())
+            misses.append(frame_cache_stats()["misses"])
+        self.assertEqual(stacks[0], stacks[1])
+        # The second capture looked nothing up
+        self.assertEqual(misses[0], misses[1])
+        self.assertGreater(frame_cache_stats()["hits"], 0)
+
+    def test_frames_outside_project_skipped(self):
+        cwd = os.getcwd()
+        self.addCleanup(os.chdir, cwd)
+        os.chdir(os.path.dirname(os.__file__))
+        self.assertEqual(call_site(), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,5 +1,8 @@
+import inspect
 import unittest
-from sublingual_eval.abstract.grammar import grammar, Format, Concat, Var, Literal, InferredVar
+from unittest import mock
+from sublingual_eval.abstract import grammar as grammar_module
+from sublingual_eval.abstract.grammar import grammar, convert_grammar_to_dict, DeferredGrammar, Format, Concat, Var, Literal, InferredVar
 
 class TestGrammar(unittest.TestCase):
     def compare_dicts(self, result, expected):
@@ -312,6 +315,49 @@ class TestGrammar(unittest.TestCase):
             {"role": "user", "content": Literal("Hello")}
         ]
         self.assertListEqual(result, expected)
+    def test_call_site_parsed_once(self):
+        """Test that a cached call site still reads each call's values"""
+        def ask(name):
+            return grammar([{"role": "user", "content": f"hi {name}"}])
+
+        with mock.patch.object(grammar_module, "parse_arg_node", wraps=grammar_module.parse_arg_node) as parse:
+            results = [ask("ann"), ask("bob")]
+        self.assertEqual(parse.call_count, 1)
+        self.assertListEqual(results, [
+            [{"role": "user", "content": Format(Literal("hi {}"), InferredVar("name", name))}]
+            for name in ("ann", "bob")
+        ])
+    def test_deferred_grammar(self):
+        """Test that a grammar resolved later matches one worked out at the call"""
+        def create(messages):
+            caller_frame = inspect.currentframe().f_back
+            return DeferredGrammar(caller_frame, "create", caller_frame.f_locals)
+
+        def ask(name):
+            return create(messages=[{"role": "user", "content": f"hi {name}"}])
+
+        deferred = ask("ann")
+        expected = [{"role": "user", "content": Format(Literal("hi {}"), InferredVar("name", "ann"))}]
+        self.assertListEqual(deferred.resolve(), convert_grammar_to_dict(expected))
+
+    def test_deferred_grammar_ignores_later_changes(self):
+        """Test that changing a local after the call doesn't change the deferred grammar"""
+        def create(messages):
+            caller_frame = inspect.currentframe().f_back
+            return DeferredGrammar(caller_frame, "create", caller_frame.f_locals)
+
+        unused = ["not in the prompt"]
+
+        def ask(docs):
+            deferred = create(messages=[{"role": "user", "content": f"read {docs}"}])
+            docs.append("second")
+            return deferred, unused
+
+        deferred, _ = ask(["first"])
+        expected = [{"role": "user", "content": Format(Literal("read {}"), InferredVar("docs", ["first"]))}]
+        self.assertListEqual(deferred.resolve(), convert_grammar_to_dict(expected))
+        # Locals the call doesn't use aren't copied
+        self.assertIs(deferred.f_locals["unused"], unused)
 
 if __name__ == '__main__':
     unittest.main() 
\ No newline at end of file